@@ -1,29 +1,164 @@
 # app.py - Updated with Image Upload for Products
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, Response, has_request_context, get_template_attribute, stream_template, stream_with_context, send_from_directory
 import sqlite3
 import uuid
-from datetime import datetime
+import hmac
+import hashlib
+import time
+import queue
+import threading
+import pathlib
+import functools
+import collections
+import sys
+import tempfile
+import logging
+import logging.handlers
+from datetime import datetime, timedelta
 import requests
 import os
 from functools import wraps
 import json
 import urllib.parse
 import re
+import csv
+import io
+import itertools
+import contextlib
+import atexit
+import zipfile
+import cProfile
+import pstats
+import mmap
+import struct
+from xml.sax.saxutils import escape as xml_escape
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
-app.config['DATABASE'] = 'store.db'
-app.config['UPLOAD_FOLDER'] = 'static/receipts'
+app.config['DATABASE'] = os.environ.get('DATABASE', 'store.db')
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'static/receipts')
 app.config['PRODUCT_IMAGE_FOLDER'] = 'static/product_images'
 app.config['ALLOWED_IMAGE_EXTENSIONS'] = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
 app.config['MAX_IMAGE_SIZE'] = 5 * 1024 * 1024  # 5MB
+app.config['TELEGRAM_ENABLED'] = True  # off for synthetic-data commands
+# Points at a local stub during `flask load-test`
+app.config['TELEGRAM_API_URL'] = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+app.config['SLOW_QUERY_MS'] = 100  # single statement
+app.config['SLOW_REQUEST_DB_MS'] = 500  # all statements in one request
 
 # Create necessary folders
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['PRODUCT_IMAGE_FOLDER'], exist_ok=True)
 
+# ================ LOGGING ================
+# One JSON object per line on stdout. Records are formatted on the calling
+# thread (so request context is still available) and written by a
+# QueueListener thread, so a slow stdout never holds up a request.
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Attributes every LogRecord has; anything else on a record is an `extra` field
+_LOG_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+class JsonLogFormatter(logging.Formatter):
+    """Render a record, its extra fields and any traceback as one JSON line"""
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _LOG_RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Tag records logged during a request with its ID and route"""
+    def filter(self, record):
+        if has_request_context():
+            record.__dict__.setdefault('request_id', g.get('request_id'))
+            record.__dict__.setdefault('endpoint', request.endpoint)
+            record.__dict__.setdefault('method', request.method)
+            record.__dict__.setdefault('path', request.path)
+        return True
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that (re)starts its listener in each worker process"""
+    def __init__(self, *handlers):
+        super().__init__(queue.Queue(-1))
+        self.handlers = handlers
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def start_listener(self):
+        # A forked worker inherits the queue but not the listener thread
+        with self.start_lock:
+            if self.pid != os.getpid():
+                self.queue = queue.Queue(-1)
+                self.listener = logging.handlers.QueueListener(self.queue, *self.handlers)
+                self.listener.start()
+                self.pid = os.getpid()
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start_listener()
+        self.queue.put_nowait(record)
+
+    def stop(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+
+def setup_logging():
+    """Attach the queued JSON handler to the app logger"""
+    logger = logging.getLogger('eunicefoodie')
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter('%(message)s'))
+    handler = LogQueueHandler(stream)
+    handler.setFormatter(JsonLogFormatter())
+    handler.addFilter(RequestContextFilter())
+    logger.addHandler(handler)
+    logger.setLevel(app.config['LOG_LEVEL'])
+    logger.propagate = False
+    atexit.register(handler.stop)
+    return logger
+
+log = setup_logging()
+
+@app.before_request
+def start_request_log():
+    """Give the request an ID (kept from X-Request-ID if a proxy set one)"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.log_started = time.perf_counter()
+
+@app.after_request
+def add_request_id_header(response):
+    """Echo the request ID so a client report can be matched to the log"""
+    g.log_status = response.status_code
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def log_request(exception):
+    """One line per request with status and total duration"""
+    started = g.pop('log_started', None)
+    if started is None:
+        return
+    level = logging.DEBUG if request.endpoint == 'static' else logging.INFO
+    if exception is not None:
+        level = logging.ERROR
+    if log.isEnabledFor(level):
+        log.log(level, 'request', extra={
+            'status': g.get('log_status', 500 if exception is not None else 200),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        }, exc_info=exception)
+
 # ================ HELPER FUNCTIONS ================
 def allowed_file(filename):
     """Check if the file extension is allowed"""
@@ -51,23 +186,23 @@ def generate_secure_filename(original_filename, order_id):
     return f"receipt_{order_id}_{timestamp}_{unique_id}.{file_ext}"
 
 # ================ TEMPLATE FILTER ================
+# Named formats templates can pass instead of a strftime pattern
+DATETIME_FORMATS = {
+    'short': '%d %b, %I:%M %p',
+    'date': '%Y-%m-%d',
+}
+
 @app.template_filter('datetimeformat')
 def datetimeformat(value, format='%d %b %Y, %I:%M %p'):
     """Custom template filter to format datetime"""
-    if value:
-        if isinstance(value, str):
-            try:
-                for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d'):
-                    try:
-                        value = datetime.strptime(value, fmt)
-                        break
-                    except ValueError:
-                        continue
-            except:
-                return value
-        if isinstance(value, datetime):
-            return value.strftime(format)
-    return ''
+    if not value:
+        return ''
+    format = DATETIME_FORMATS.get(format, format)
+    # TIMESTAMP columns arrive as datetime already; computed ones are still text
+    if isinstance(value, datetime):
+        return value.strftime(format)
+    value = to_datetime(value)
+    return value.strftime(format) if isinstance(value, datetime) else ''
 # =================================================
 
 # Telegram Configuration
@@ -91,11 +226,35 @@ STATE_REGIONS = {
 PAYMENT_METHODS = ['Bank Transfer', 'Touch \'n Go (TnG)']
 
 # ================ DATABASE FUNCTIONS ================
+# Timestamps are stored as ISO-8601 text ('YYYY-MM-DD HH:MM:SS', what
+# CURRENT_TIMESTAMP writes), which sorts and range-scans correctly as text.
+# Request connections use PARSE_DECLTYPES so TIMESTAMP columns come back as
+# datetime objects instead of being re-parsed in every template.
+def to_datetime(value):
+    """ISO-8601 text -> datetime; anything unparseable is returned unchanged"""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+def convert_timestamp(value):
+    """sqlite3 converter for TIMESTAMP columns"""
+    return to_datetime(value.decode())
+
+sqlite3.register_converter('TIMESTAMP', convert_timestamp)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+
 def init_db():
     """Initialize database with your products"""
     conn = sqlite3.connect(app.config['DATABASE'])
     cursor = conn.cursor()
     
+    # WAL lets report snapshots read while checkouts write
+    try:
+        cursor.execute('PRAGMA journal_mode = WAL')
+    except sqlite3.OperationalError as e:
+        log.warning("Could not switch to WAL yet", extra={'error': str(e)})
+    
     # Products table with image_url column
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS products (
@@ -129,6 +288,7 @@ def init_db():
             payment_verified_at TIMESTAMP,
             payment_verified_by TEXT,
             tracking_number TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
@@ -149,6 +309,84 @@ def init_db():
         )
     ''')
     
+    # Order change feed for live admin updates
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT,
+            event TEXT NOT NULL,
+            payload TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Running per-product totals of verified orders, bucketed by order status
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reservation_summary (
+            product_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            total_quantity INTEGER NOT NULL DEFAULT 0,
+            total_weight REAL NOT NULL DEFAULT 0,
+            total_cost REAL NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, status)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)')
+    # Per-product sales totals on the shop page join order lines by product
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_product_id ON order_items (product_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_payment_status_created_at ON orders (payment_status, created_at)')
+    # Bulk transitions page through the orders in one state in primary-key order
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status_payment_status_id ON orders (status, payment_status, id)')
+    # Newest-first order lists (admin orders, recent orders) walk this instead of sorting
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at)')
+    
+    # Frozen reservation reports for date ranges that have already ended
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_snapshots (
+            period_start TEXT NOT NULL,
+            period_end TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            products TEXT NOT NULL,
+            order_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (period_start, period_end)
+        )
+    ''')
+    # Their order lines, in report order, one row per item (or per order without items)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS report_snapshot_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            period_start TEXT NOT NULL,
+            period_end TEXT NOT NULL,
+            order_id TEXT NOT NULL,
+            customer_name TEXT,
+            contact_number TEXT,
+            created_at TIMESTAMP,
+            total_price REAL,
+            product_name TEXT,
+            quantity INTEGER,
+            price REAL,
+            unit_weight REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_report_snapshot_lines_period '
+                   'ON report_snapshot_lines (period_start, period_end, id)')
+    
+    # Progress of chunked bulk transitions, so interrupted runs can resume
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bulk_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transition TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_order_id INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            started_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
     # Admin users table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS admin_users (
@@ -233,30 +471,1004 @@ def update_products_table():
         
         if 'image_url' not in columns:
             cursor.execute('ALTER TABLE products ADD COLUMN image_url TEXT')
-            print("✅ Added image_url column to products table")
+            log.info('Added image_url column to products table')
             conn.commit()
             
-    except Exception as e:
-        print(f"❌ Error updating products table: {e}")
+    except Exception:
+        log.exception('Error updating products table')
+    finally:
+        conn.close()
+
+def update_orders_table():
+    """Add version column to orders table if it doesn't exist"""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(orders)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        # Bumped on every write so edit forms can detect concurrent changes
+        if 'version' not in columns:
+            cursor.execute('ALTER TABLE orders ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+            log.info('Added version column to orders table')
+            conn.commit()
+
+    except Exception:
+        log.exception('Error updating orders table')
+    finally:
+        conn.close()
+
+def update_report_snapshots_table():
+    """Add order_count column to report_snapshots if it doesn't exist"""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(report_snapshots)")
+        columns = [column[1] for column in cursor.fetchall()]
+
+        # Snapshots written before this have no frozen order lines; they
+        # are taken again the next time the period is viewed
+        if 'order_count' not in columns:
+            cursor.execute('ALTER TABLE report_snapshots ADD COLUMN order_count INTEGER')
+            log.info('Added order_count column to report_snapshots table')
+            conn.commit()
+
+    except Exception:
+        log.exception('Error updating report_snapshots table')
+    finally:
+        conn.close()
+
+def update_reservation_summary_table():
+    """Backfill reservation_summary from existing orders if it is empty"""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.row_factory = sqlite3.Row
+
+    try:
+        if not conn.execute('SELECT 1 FROM reservation_summary LIMIT 1').fetchone():
+            rebuild_reservation_summary(conn)
+            conn.commit()
+            log.info('Rebuilt reservation summary')
+    except Exception:
+        log.exception('Error updating reservation summary')
     finally:
         conn.close()
 
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+def ensure_schema():
+    """Run schema setup and upgrades once per process (gunicorn never reaches __main__)"""
+    global _schema_checked
+    if _schema_checked:
+        return
+    # The first requests of a threaded worker arrive together; only one of them migrates
+    with _schema_lock:
+        if not _schema_checked:
+            init_db()
+            update_products_table()
+            update_orders_table()
+            update_report_snapshots_table()
+            update_reservation_summary_table()
+            _schema_checked = True
+
+def reset_schema_check():
+    """Make the next request check the schema again (after DATABASE changes)"""
+    global _schema_checked
+    with _schema_lock:
+        _schema_checked = False
+
+# ================ METRICS ================
+# Prometheus metrics shared by every gunicorn worker. Each worker process owns
+# one mmap-backed file in METRICS_DIR holding (sample name, float64 value)
+# slots; /metrics sums the files of all workers at scrape time. A worker
+# taking over from an exited one folds that worker's counters into its own
+# file and deletes it, and gunicorn.conf.py empties METRICS_DIR when the
+# server starts, so each deploy begins from zero.
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'eunicefoodie-metrics')
+# Scrapers can send "Authorization: Bearer <METRICS_TOKEN>" instead of logging in
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# name -> (type, help)
+METRIC_FAMILIES = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency until the response is returned; '
+                                                   'bodies streamed with stream_with_context included'),
+    'http_requests_in_flight': ('gauge', 'Requests currently being handled'),
+    'sqlite_busy_total': ('counter', 'Statements that failed with database is locked/busy'),
+    'sqlite_retries_total': ('counter', 'Lock acquisitions retried after SQLITE_BUSY'),
+    'telegram_messages_total': ('counter', 'Telegram notifications, by result'),
+    'telegram_request_duration_seconds': ('histogram', 'Telegram sendMessage latency'),
+    'upload_bytes_total': ('counter', 'Bytes of uploaded files saved, by kind'),
+    'uploads_total': ('counter', 'Uploaded files saved, by kind'),
+}
+
+def metric_key(name, **labels):
+    """Sample name in exposition format, e.g. uploads_total{kind="receipt"}"""
+    if not labels:
+        return name
+    pairs = ','.join(
+        '{}="{}"'.format(label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for label, value in sorted(labels.items())
+    )
+    return f'{name}{{{pairs}}}'
+
+class SharedMetrics:
+    """Per-process mmap file of named float64 slots, readable by every worker.
+
+    Layout: an 8-byte header with the bytes in use, then entries of
+    [key length u32][key, padded to 8 bytes][value f64]. Entries are only
+    appended, so readers never see a slot move.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+    _HEADER = struct.Struct('<Q')
+    _KEY_LENGTH = struct.Struct('<I')
+    _VALUE = struct.Struct('<d')
+
+    def __init__(self, directory_config='METRICS_DIR'):
+        self.directory_config = directory_config
+        self.lock = threading.Lock()
+        self.pid = None
+        self.directory = None
+        self.map = None
+        self.file = None
+        self.slots = {}
+
+    def _open(self):
+        # Opened lazily, again after a fork so each worker gets its own file,
+        # and again when METRICS_DIR changes (developer commands)
+        directory = app.config[self.directory_config]
+        os.makedirs(directory, exist_ok=True)
+        self.pid = os.getpid()
+        self.directory = directory
+        path = os.path.join(directory, f'metrics_{self.pid}.db')
+        # A file under our pid belongs to an earlier process that had it
+        stale = self._claim(path)
+        self.file = open(path, 'w+b')
+        self.file.truncate(self.INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), self.INITIAL_SIZE)
+        self._HEADER.pack_into(self.map, 0, self._HEADER.size)
+        self.slots = {}
+        if stale:
+            self._adopt(stale)
+        for other in pathlib.Path(directory).glob('metrics_*.db'):
+            pid = metric_file_pid(other)
+            if pid is not None and pid != self.pid and not process_alive(pid):
+                claimed = self._claim(other)
+                if claimed:
+                    self._adopt(claimed)
+
+    def _claim(self, path):
+        """Rename an exited worker's file so no other worker adopts it too"""
+        claimed = f'{path}.{self.pid}'
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            return None
+        return claimed
+
+    def _adopt(self, path):
+        """Carry an exited worker's counters and histograms over, then delete its file"""
+        for key, value in read_metric_file(path):
+            if METRIC_FAMILIES.get(metric_family(key), ('',))[0] != 'gauge':
+                self._increment(key, value)
+        os.remove(path)
+
+    def _increment(self, key, amount):
+        offset = self._slot(key)
+        value = self._VALUE.unpack_from(self.map, offset)[0]
+        self._VALUE.pack_into(self.map, offset, value + amount)
+
+    def _slot(self, key):
+        offset = self.slots.get(key)
+        if offset is not None:
+            return offset
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (-(self._KEY_LENGTH.size + len(encoded)) % 8)
+        used = self._HEADER.unpack_from(self.map, 0)[0]
+        end = used + self._KEY_LENGTH.size + padded + self._VALUE.size
+        if end > len(self.map):
+            size = len(self.map)
+            while size < end:
+                size *= 2
+            self.file.truncate(size)
+            self.map.resize(size)
+        self._KEY_LENGTH.pack_into(self.map, used, len(encoded))
+        start = used + self._KEY_LENGTH.size
+        self.map[start:start + len(encoded)] = encoded
+        offset = start + padded
+        self._VALUE.pack_into(self.map, offset, 0.0)
+        # Publish the entry only once it is fully written
+        self._HEADER.pack_into(self.map, 0, end)
+        self.slots[key] = offset
+        return offset
+
+    def add(self, name, amount=1.0, **labels):
+        """Add to a counter or gauge sample"""
+        key = metric_key(name, **labels)
+        with self.lock:
+            if self.pid != os.getpid() or self.directory != app.config[self.directory_config]:
+                self._open()
+            self._increment(key, amount)
+
+    def observe(self, name, seconds, buckets=LATENCY_BUCKETS, **labels):
+        """Record one histogram observation (cumulative buckets, sum and count)"""
+        for bound in buckets:
+            if seconds <= bound:
+                self.add(f'{name}_bucket', le=repr(bound), **labels)
+        self.add(f'{name}_bucket', le='+Inf', **labels)
+        self.add(f'{name}_sum', seconds, **labels)
+        self.add(f'{name}_count', **labels)
+
+def metric_file_pid(path):
+    """Worker pid from a metrics_<pid>.db path (None for other files)"""
+    try:
+        return int(pathlib.Path(path).stem.split('_', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def read_metric_file(path):
+    """Yield (key, value) for every slot in one metrics file"""
+    try:
+        data = pathlib.Path(path).read_bytes()
+    except OSError:
+        return
+    if len(data) < SharedMetrics._HEADER.size:
+        return
+    used = min(SharedMetrics._HEADER.unpack_from(data, 0)[0], len(data))
+    position = SharedMetrics._HEADER.size
+    while position + SharedMetrics._KEY_LENGTH.size <= used:
+        length = SharedMetrics._KEY_LENGTH.unpack_from(data, position)[0]
+        start = position + SharedMetrics._KEY_LENGTH.size
+        offset = start + length + (-(SharedMetrics._KEY_LENGTH.size + length) % 8)
+        if offset + SharedMetrics._VALUE.size > used:
+            break
+        key = data[start:start + length].decode('utf-8', 'replace')
+        yield key, SharedMetrics._VALUE.unpack_from(data, offset)[0]
+        position = offset + SharedMetrics._VALUE.size
+
+def read_metric_files(directory):
+    """Yield (pid, key, value) for every slot in every worker's metrics file"""
+    for path in pathlib.Path(directory).glob('metrics_*.db'):
+        pid = metric_file_pid(path)
+        if pid is None:
+            continue
+        for key, value in read_metric_file(path):
+            yield pid, key, value
+
+def process_alive(pid):
+    """Whether a worker process still exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def metric_family(key):
+    """Family name a sample key belongs to"""
+    name = key.split('{', 1)[0]
+    for suffix in ('_bucket', '_sum', '_count'):
+        base = name[:-len(suffix)]
+        if name.endswith(suffix) and METRIC_FAMILIES.get(base, ('',))[0] == 'histogram':
+            return base
+    return name
+
+def render_metrics(directory):
+    """All workers' samples summed per key, in Prometheus text format"""
+    totals = {}
+    alive = {}
+    for pid, key, value in read_metric_files(directory):
+        family = metric_family(key)
+        # Counters of exited workers count until a live worker adopts them; their gauges don't
+        if METRIC_FAMILIES.get(family, ('',))[0] == 'gauge':
+            if pid not in alive:
+                alive[pid] = process_alive(pid)
+            if not alive[pid]:
+                continue
+        totals.setdefault(family, {})
+        totals[family][key] = totals[family].get(key, 0.0) + value
+
+    lines = []
+    for family in sorted(totals):
+        kind, help_text = METRIC_FAMILIES.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for key in sorted(totals[family]):
+            lines.append(f'{key} {totals[family][key]:.17g}')
+    return '\n'.join(lines) + '\n'
+
+metrics = SharedMetrics()
+
+def is_sqlite_busy(error):
+    """Whether an OperationalError is SQLITE_BUSY / SQLITE_LOCKED"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def begin_immediate(conn, attempts=3, backoff=0.05):
+    """BEGIN IMMEDIATE, retried a few times when another writer holds the lock"""
+    for attempt in range(1, attempts + 1):
+        try:
+            return conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as e:
+            if not is_sqlite_busy(e) or attempt == attempts:
+                raise
+            metrics.add('sqlite_retries_total', statement='BEGIN IMMEDIATE')
+            time.sleep(backoff * attempt)
+
+def metrics_endpoint():
+    """Endpoint label for the current request"""
+    return request.endpoint or '<unmatched>'
+
+@app.before_request
+def start_request_metrics():
+    """Count the request as in flight and start its latency timer"""
+    g.request_started = time.perf_counter()
+    metrics.add('http_requests_in_flight', endpoint=metrics_endpoint())
+
+@app.after_request
+def record_response_status(response):
+    """Remember the status for the request counter in teardown"""
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception):
+    """Record latency once the response (streamed bodies included) is done"""
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = metrics_endpoint()
+    status = g.pop('response_status', 500 if exception is not None else 200)
+    metrics.add('http_requests_in_flight', -1, endpoint=endpoint)
+    metrics.add('http_requests_total', endpoint=endpoint, method=request.method, status=status)
+    metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                    endpoint=endpoint, method=request.method)
+
+def record_upload(kind, path):
+    """Count a saved upload and its size"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    metrics.add('uploads_total', kind=kind)
+    metrics.add('upload_bytes_total', size, kind=kind)
+
+# ================ SQL INSTRUMENTATION ================
+# Every statement run on an app connection is recorded for the current
+# request: normalized text, time (execute plus fetching) and rows. At the end
+# of the request the records feed the slow-query log and per-endpoint totals.
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SQL_IN_LISTS = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """Collapse whitespace, literals and IN lists so equal statements group together"""
+    sql = _SQL_LITERALS.sub('?', ' '.join(sql.split()))
+    return _SQL_IN_LISTS.sub('IN (...)', sql)
+
+# normalized sql -> first raw statement, its parameters and the endpoints
+# running it; only collected while `flask explain-queries` runs
+sql_registry = None
+
+@contextlib.contextmanager
+def collect_sql_statements():
+    """Collect every statement requests run inside the block into the yielded sql_registry dict"""
+    global sql_registry
+    sql_registry = {}
+    try:
+        yield sql_registry
+    finally:
+        sql_registry = None
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records its statements on the current request"""
+
+    query = None
+
+    def _start(self, sql, parameters=None):
+        self.query = None
+        if has_request_context():
+            self.query = {
+                'sql': normalize_sql(sql),
+                'ms': 0.0,
+                'rows': 0,
+                # Fingerprint only; lets the N+1 detector tell repeats apart
+                'params': None if parameters is None else hash(repr(parameters))
+            }
+            g.setdefault('sql_queries', []).append(self.query)
+            if sql_registry is not None:
+                entry = sql_registry.setdefault(self.query['sql'], {
+                    'sql': sql, 'params': parameters, 'endpoints': set()
+                })
+                entry['endpoints'].add(request.endpoint or '<unmatched>')
+
+    def _finish(self, started, rows=0):
+        if self.query is not None:
+            self.query['ms'] += (time.perf_counter() - started) * 1000
+            self.query['rows'] += rows
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            if is_sqlite_busy(e):
+                metrics.add('sqlite_busy_total', endpoint=metrics_endpoint() if has_request_context() else '<none>')
+            raise
+        finally:
+            self._finish(started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.OperationalError as e:
+            if is_sqlite_busy(e):
+                metrics.add('sqlite_busy_total', endpoint=metrics_endpoint() if has_request_context() else '<none>')
+            raise
+        finally:
+            self._finish(started, max(self.rowcount, 0))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._finish(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._finish(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._finish(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._finish(started, 1)
+        return row
+
+_sql_stats_lock = threading.Lock()
+# endpoint -> request count, query count, DB time and worst single request
+sql_endpoint_stats = {}
+_slow_query_logger = None
+
+def slow_query_log():
+    """Logger writing to the slow-query log file, set up on first use"""
+    global _slow_query_logger
+    if _slow_query_logger is None:
+        logger = logging.getLogger('eunicefoodie.slow_sql')
+        logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            app.config['SLOW_QUERY_LOG'], maxBytes=5 * 1024 * 1024, backupCount=3
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        _slow_query_logger = logger
+    return _slow_query_logger
+
+def record_request_sql(endpoint, queries):
+    """Log slow statements / requests and add the request to its endpoint totals"""
+    count = route_query_count(queries)
+    db_ms = sum(query['ms'] for query in queries)
+
+    slow_ms = app.config['SLOW_QUERY_MS']
+    for query in queries:
+        if query['ms'] >= slow_ms:
+            slow_query_log().info(f"{endpoint} {query['ms']:.1f}ms rows={query['rows']} {query['sql']}")
+    if db_ms >= app.config['SLOW_REQUEST_DB_MS']:
+        slow_query_log().info(f"{endpoint} request total {db_ms:.1f}ms across {count} queries")
+
+    for problem in check_query_problems(endpoint, queries):
+        recent_query_problems.append(problem)
+        if app.debug or app.testing:
+            log.warning(problem)
+
+    with _sql_stats_lock:
+        stats = sql_endpoint_stats.setdefault(endpoint, {
+            'requests': 0, 'queries': 0, 'db_ms': 0.0, 'max_queries': 0, 'max_db_ms': 0.0
+        })
+        stats['requests'] += 1
+        stats['queries'] += count
+        stats['db_ms'] += db_ms
+        stats['max_queries'] = max(stats['max_queries'], count)
+        stats['max_db_ms'] = max(stats['max_db_ms'], db_ms)
+
+# Most queries one request to each endpoint may run, context processors and
+# the admin sidebar included. Checked on every request; `flask
+# check-query-budgets` fails when one is exceeded on synthetic data. Admin
+# pages get one extra query for the sidebar counts (admin_quick_stats); BEGIN
+# on a read-only snapshot counts as a query.
+QUERY_BUDGETS = {
+    # product list with sales totals
+    'user_products': 1,
+    # the posted products, fetched together
+    'add_to_cart': 1,
+    # shop settings
+    'user_checkout': 1,
+    # BEGIN, counts (shared with the sidebar), recent orders, orders to verify, revenue
+    'admin_dashboard': 5,
+    # orders with item counts, sidebar
+    'admin_orders': 2,
+    # order, its items, sidebar
+    'order_details': 3,
+    # orders to verify, all their items in one query, sidebar
+    'admin_verify_payments': 3,
+    # BEGIN, order count, product summary, sidebar, streamed order lines
+    'reservation_report': 5,
+    # BEGIN, order count, product summary, streamed order lines
+    'export_reservation_report': 4
+}
+# Same statement with this many different parameter sets in one request = N+1
+N_PLUS_ONE_THRESHOLD = 3
+# Endpoints that repeat statements on purpose (chunked bulk work)
+N_PLUS_ONE_EXEMPT = {'mark_reserved_as_ordered', 'order_stream'}
+recent_query_problems = collections.deque(maxlen=100)
+
+def find_repeated_queries(queries, threshold=N_PLUS_ONE_THRESHOLD):
+    """Statements run with at least `threshold` different parameter sets: {sql: count}"""
+    params_by_sql = {}
+    for query in queries:
+        if query.get('params') is not None:
+            params_by_sql.setdefault(query['sql'], set()).add(query['params'])
+    return {sql: len(params) for sql, params in params_by_sql.items() if len(params) >= threshold}
+
+def route_query_count(queries):
+    """Queries the route itself ran; connection setup and WAL checkpoints (PRAGMAs) don't count"""
+    return sum(1 for query in queries if not query['sql'].startswith('PRAGMA'))
+
+def check_query_problems(endpoint, queries):
+    """N+1 patterns and budget overruns in one request, as readable messages"""
+    problems = []
+    if endpoint not in N_PLUS_ONE_EXEMPT:
+        for sql, count in find_repeated_queries(queries).items():
+            problems.append(f"{endpoint}: N+1 - ran {count} times with different parameters: {sql}")
+
+    budget = QUERY_BUDGETS.get(endpoint)
+    counted = route_query_count(queries)
+    if budget is not None and counted > budget:
+        problems.append(f"{endpoint}: {counted} queries, budget is {budget}")
+    return problems
+
+@app.after_request
+def add_sql_headers(response):
+    """Expose the request's query count (as budgeted in QUERY_BUDGETS) and DB time in debug mode"""
+    if app.debug:
+        queries = g.get('sql_queries', [])
+        response.headers['X-Query-Count'] = str(route_query_count(queries))
+        response.headers['X-DB-Time'] = f"{sum(query['ms'] for query in queries):.1f}ms"
+    return response
+
+# ================ CONNECTION POOL ================
+# Request connections are pooled per worker and shared between its threads.
+# Every connection counts itself so the leak detector in teardown_request can
+# warn about routes that open connections and never close them.
+#
+# render.yaml runs gunicorn with the gthread worker (--threads 8), so up to
+# WORKER_THREADS requests per worker share one SQLite file and its single write
+# lock. Both pools keep one idle connection per thread, and a writer waits up
+# to DB_BUSY_TIMEOUT_SECONDS for the lock instead of sqlite3's default 5s, which
+# a burst of checkouts from eight threads can exceed. Keep WORKER_THREADS in
+# step with --threads.
+WORKER_THREADS = 8
+DB_POOL_SIZE = WORKER_THREADS
+DB_BUSY_TIMEOUT_SECONDS = 15
+
+_connection_count_lock = threading.Lock()
+_open_connections = 0
+
+def _count_connection(delta):
+    """Adjust this worker's count of open SQLite connections"""
+    global _open_connections
+    with _connection_count_lock:
+        _open_connections += delta
+
+class TrackedConnection(sqlite3.Connection):
+    """sqlite3 connection that keeps the worker's open-connection count"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.closed = False
+        _count_connection(1)
+        if has_request_context():
+            g.setdefault('opened_connections', []).append(self)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() doesn't go through cursor(), so route it there
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            _count_connection(-1)
+        super().close()
+
+    def __del__(self):
+        # Garbage-collected without close(): SQLite closes it, keep the count right
+        if not self.closed:
+            self.closed = True
+            _count_connection(-1)
+
+class ConnectionPool:
+    """Small LIFO pool of connections to one database, safe to share across threads"""
+
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        """Take an idle connection, or open a new one when none is left"""
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            # Drop connections to a database the app no longer points at
+            if conn.path == app.config['DATABASE']:
+                return conn
+            conn.close()
+
+    def release(self, conn):
+        """Hand a connection back, discarding any unfinished transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
 def get_db_connection():
     """Get database connection"""
-    conn = sqlite3.connect(app.config['DATABASE'])
+    conn = sqlite3.connect(app.config['DATABASE'], factory=TrackedConnection, check_same_thread=False,
+                           timeout=DB_BUSY_TIMEOUT_SECONDS, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.row_factory = sqlite3.Row
+    conn.path = app.config['DATABASE']
+    return conn
+
+db_pool = ConnectionPool(get_db_connection, DB_POOL_SIZE)
+
+# ================ READ-ONLY SNAPSHOTS ================
+# Reports and dashboard aggregates read through their own pool of read-only
+# connections. A request gets one read transaction, i.e. one consistent WAL
+# snapshot, and never competes with checkouts for the write lock. WAL
+# checkpoints are run once the last snapshot in this worker has finished, so
+# a long report does not leave them stuck behind its read mark.
+READONLY_POOL_SIZE = WORKER_THREADS
+CHECKPOINT_MIN_INTERVAL_SECONDS = 30
+
+_snapshot_lock = threading.Lock()
+_active_snapshots = 0
+_last_checkpoint = 0.0
+
+def get_readonly_connection():
+    """Open a read-only connection (mode=ro, query_only) to the app database"""
+    uri = pathlib.Path(app.config['DATABASE']).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, factory=TrackedConnection, check_same_thread=False,
+                           timeout=DB_BUSY_TIMEOUT_SECONDS, detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute('PRAGMA query_only = ON')
     conn.row_factory = sqlite3.Row
+    conn.path = app.config['DATABASE']
     return conn
 
+readonly_pool = ConnectionPool(get_readonly_connection, READONLY_POOL_SIZE)
+
+def read_snapshot():
+    """Read-only connection for this request, inside a single snapshot transaction"""
+    global _active_snapshots
+    if 'ro_conn' not in g:
+        conn = readonly_pool.acquire()
+        conn.execute('BEGIN')
+        with _snapshot_lock:
+            _active_snapshots += 1
+        g.ro_conn = conn
+    return g.ro_conn
+
+def release_read_snapshot(conn):
+    """End the request's snapshot and checkpoint if it was the last one open"""
+    global _active_snapshots, _last_checkpoint
+    readonly_pool.release(conn)
+
+    with _snapshot_lock:
+        _active_snapshots -= 1
+        due = (_active_snapshots == 0
+               and time.monotonic() - _last_checkpoint >= CHECKPOINT_MIN_INTERVAL_SECONDS)
+        if due:
+            _last_checkpoint = time.monotonic()
+
+    if due:
+        checkpoint_wal()
+
+def checkpoint_wal():
+    """Copy committed WAL pages back into the database without blocking anyone"""
+    conn = db_pool.acquire()
+    try:
+        busy, wal_pages, copied = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        if wal_pages > 0:
+            log.info('WAL checkpoint', extra={'copied_pages': copied, 'wal_pages': wal_pages, 'busy': bool(busy)})
+    except sqlite3.Error as e:
+        log.warning('WAL checkpoint failed', extra={'error': str(e)})
+    finally:
+        db_pool.release(conn)
+
 @app.before_request
 def before_request():
     """Set database connection before each request"""
-    g.conn = get_db_connection()
+    ensure_schema()
+    # One-off schema checks shouldn't count against the first request's budget
+    g.pop('sql_queries', None)
+    g.conn = db_pool.acquire()
 
 @app.teardown_request
 def teardown_request(exception):
-    """Close database connection after each request"""
-    if hasattr(g, 'conn'):
-        g.conn.close()
+    """Return the request's connections to their pools and report leaked ones"""
+    conn = g.pop('conn', None)
+    ro_conn = g.pop('ro_conn', None)
+    g.pop('quick_stats', None)
+
+    # Checked before releasing, so another thread reusing a pooled
+    # connection can't be mistaken for a leak
+    leaked = [c for c in g.pop('opened_connections', [])
+              if not c.closed and c is not conn and c is not ro_conn]
+    if leaked:
+        log.warning('Request left connections open', extra={
+            'leaked': len(leaked), 'open_connections': _open_connections, 'pid': os.getpid()
+        })
+
+    if conn is not None:
+        db_pool.release(conn)
+    if ro_conn is not None:
+        release_read_snapshot(ro_conn)
+
+    record_request_sql(request.endpoint or '<unmatched>', g.pop('sql_queries', []))
+
+# ================ REQUEST PROFILING ================
+# An admin adds ?_profile=1 (or sends "X-Profile: 1") to any page to run that
+# one request under cProfile. The summary and the raw .prof file are written
+# to PROFILE_DIR so every worker's profiles show up on /admin/profiles.
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_KEEP = 50
+PROFILE_TOP_FUNCTIONS = 30
+# cProfile hooks the whole interpreter thread; one profiled request at a time
+_profile_lock = threading.Lock()
+
+def profiling_requested():
+    """Whether an admin asked for this request to be profiled"""
+    if 'admin_logged_in' not in session:
+        return False
+    flag = request.args.get('_profile') or request.headers.get('X-Profile')
+    return flag not in (None, '', '0')
+
+def summarize_profile(profiler, limit=PROFILE_TOP_FUNCTIONS):
+    """Top functions by cumulative time from a finished profiler"""
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        location = name if filename == '~' else f'{name} ({os.path.basename(filename)}:{line})'
+        functions.append({
+            'function': location,
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 2),
+            'cumtime_ms': round(cumtime * 1000, 2)
+        })
+    functions.sort(key=lambda function: function['cumtime_ms'], reverse=True)
+    return functions[:limit]
+
+def summarize_profile_queries(queries):
+    """The request's statements grouped by text, slowest total first"""
+    grouped = {}
+    for query in queries:
+        entry = grouped.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'ms': 0.0, 'rows': 0})
+        entry['count'] += 1
+        entry['ms'] += query['ms']
+        entry['rows'] += query['rows']
+    for entry in grouped.values():
+        entry['ms'] = round(entry['ms'], 2)
+    return sorted(grouped.values(), key=lambda entry: entry['ms'], reverse=True)
+
+def save_profile(profiler, duration_ms, status):
+    """Write one profile's summary and raw stats; keep only the newest PROFILE_KEEP"""
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    created_at = datetime.now()
+    profile_id = f"{created_at.strftime('%Y%m%d_%H%M%S')}_{request.endpoint or 'unmatched'}_{uuid.uuid4().hex[:6]}"
+    queries = g.get('sql_queries', [])
+    summary = {
+        'id': profile_id,
+        'endpoint': request.endpoint or '<unmatched>',
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'status': status,
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration_ms': round(duration_ms, 1),
+        'query_count': len(queries),
+        'db_ms': round(sum(query['ms'] for query in queries), 1),
+        'functions': summarize_profile(profiler),
+        'queries': summarize_profile_queries(queries)
+    }
+    profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as f:
+        json.dump(summary, f)
+
+    for old in sorted(pathlib.Path(directory).glob('*.json'), key=os.path.getmtime)[:-PROFILE_KEEP]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.prof').unlink(missing_ok=True)
+    log.info('Saved request profile', extra={'profile_id': profile_id, 'query_count': summary['query_count']})
+    return profile_id
+
+def load_profiles(limit=PROFILE_KEEP):
+    """Saved profile summaries, newest first"""
+    directory = pathlib.Path(app.config['PROFILE_DIR'])
+    profiles = []
+    for path in sorted(directory.glob('*.json'), key=os.path.getmtime, reverse=True)[:limit]:
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+@app.before_request
+def start_profiling():
+    """Start cProfile for this request when an admin asked for it"""
+    if not profiling_requested():
+        return
+    if not _profile_lock.acquire(blocking=False):
+        log.warning('Skipped profiling: another request is being profiled')
+        return
+    g.profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profiler.enable()
+
+@app.after_request
+def add_profile_header(response):
+    """Tell the admin which profile the request will be saved as"""
+    if 'profiler' in g:
+        g.profile_status = response.status_code
+        response.headers['X-Profile'] = url_for('admin_profiles')
+    return response
+
+@app.teardown_request
+def finish_profiling(exception):
+    """Stop the profiler after the response (streamed bodies included) and save it"""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    try:
+        profiler.disable()
+        duration_ms = (time.perf_counter() - g.pop('profile_started')) * 1000
+        save_profile(profiler, duration_ms, g.pop('profile_status', 500 if exception is not None else 200))
+    except Exception:
+        log.exception('Could not save profile')
+    finally:
+        _profile_lock.release()
+
+# ================ TRAFFIC RECORDING ================
+# Opt-in (TRAFFIC_LOG=path): one JSON line per request with the route, timing
+# and the *shape* of its inputs, for `flask replay-traffic`. Names, phone
+# numbers, addresses, passwords and receipt contents are never written, and
+# order IDs in paths are replaced by a keyed hash (the same order always gets
+# the same one, so replay can still follow orders it creates). Each worker
+# appends to its own rotating file, TRAFFIC_LOG.<pid>.
+app.config['TRAFFIC_LOG'] = os.environ.get('TRAFFIC_LOG')
+# Values safe to keep verbatim; everything else is reduced to its length
+TRACE_SAFE_FIELDS = {'action', 'payment_method', 'state', 'status', 'payment_status',
+                     'start', 'end', 'batch', 'since', 'format'}
+TRACE_SKIP_ENDPOINTS = {'static', 'order_stream', 'order_changes', 'prometheus_metrics'}
+_traffic_logger = None
+
+def traffic_log():
+    """This worker's rotating trace file, set up on first use"""
+    global _traffic_logger
+    if _traffic_logger is None or _traffic_logger.pid != os.getpid():
+        logger = logging.getLogger(f'eunicefoodie.traffic.{os.getpid()}')
+        logger.propagate = False
+        handler = logging.handlers.RotatingFileHandler(
+            f"{app.config['TRAFFIC_LOG']}.{os.getpid()}", maxBytes=20 * 1024 * 1024, backupCount=5
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.pid = os.getpid()
+        _traffic_logger = logger
+    return _traffic_logger
+
+def trace_fields(fields):
+    """Sanitized {name: value or {'len': n}} for query string or form fields"""
+    shape = {}
+    for key, value in fields.items():
+        if key in TRACE_SAFE_FIELDS or (key.startswith('quantity_') and value.isdigit()):
+            shape[key] = value
+        else:
+            shape[key] = {'len': len(value)}
+    return shape
+
+def trace_order_id(order_id):
+    """Stable pseudonym for an order ID in traces"""
+    key = app.secret_key if isinstance(app.secret_key, bytes) else app.secret_key.encode()
+    return 'order-' + hmac.new(key, order_id.encode(), hashlib.sha256).hexdigest()[:12]
+
+def trace_path(path):
+    """URL path with the <order_id> part of matching routes replaced by its pseudonym"""
+    try:
+        _, view_args = app.url_map.bind('').match(path, method='GET')
+    except HTTPException:
+        return path
+    order_id = view_args.get('order_id')
+    if not order_id:
+        return path
+    return '/'.join(trace_order_id(part) if part == order_id else part for part in path.split('/'))
+
+@app.before_request
+def start_trace():
+    """Note the start of a request that will be recorded"""
+    if app.config['TRAFFIC_LOG'] and request.endpoint not in TRACE_SKIP_ENDPOINTS:
+        g.trace_started = (time.time(), time.perf_counter())
+        # Per-visitor id so replay can keep each visitor's requests in order;
+        # kept in g, and only stored in a session the visitor already has
+        g.trace_id = session.get('trace_id') or uuid.uuid4().hex[:12]
+        # Upload sizes only; measured before the route saves (and closes) the file
+        g.trace_files = {}
+        for name, file in request.files.items():
+            file.stream.seek(0, os.SEEK_END)
+            g.trace_files[name] = {'size': file.stream.tell()}
+            file.stream.seek(0)
+
+@app.after_request
+def capture_trace_response(response):
+    """Keep the status and redirect target for the trace"""
+    if 'trace_started' in g:
+        g.trace_status = response.status_code
+        if response.location:
+            g.trace_location = trace_path(urllib.parse.urlsplit(response.location).path)
+        # Anonymous visitors without a session cookie don't get one for tracing
+        if session and 'trace_id' not in session:
+            session['trace_id'] = g.trace_id
+    return response
+
+@app.teardown_request
+def write_trace(exception):
+    """Append the sanitized trace once the response is done"""
+    started = g.pop('trace_started', None)
+    if started is None:
+        return
+    trace = {
+        'ts': round(started[0], 3),
+        'session': g.pop('trace_id', None),
+        'admin': 'admin_logged_in' in session or request.endpoint == 'admin_login',
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': trace_path(request.path),
+        'query': trace_fields(request.args),
+        'form': trace_fields(request.form),
+        'files': g.pop('trace_files', {}),
+        'status': g.pop('trace_status', 500 if exception is not None else 200),
+        'ms': round((time.perf_counter() - started[1]) * 1000, 1)
+    }
+    location = g.pop('trace_location', None)
+    if location:
+        trace['location'] = location
+    try:
+        traffic_log().info(json.dumps(trace))
+    except OSError as e:
+        log.warning('Could not write traffic trace', extra={'error': str(e)})
 
 # ================ AUTHENTICATION ================
 def admin_required(f):
@@ -273,31 +1485,322 @@ def get_settings():
     settings = g.conn.execute('SELECT * FROM admin_settings').fetchall()
     return {row['setting_key']: row['setting_value'] for row in settings}
 
+def format_setting_message(template, **values):
+    """Fill a message template from admin settings (raw template if placeholders are invalid)"""
+    try:
+        return template.format(**values)
+    except (KeyError, IndexError, ValueError):
+        return template
+
 def send_telegram_message(message):
     """Send message to admin via Telegram bot"""
+    if not app.config['TELEGRAM_ENABLED']:
+        metrics.add('telegram_messages_total', result='skipped')
+        return True
     if not TELEGRAM_BOT_TOKEN or TELEGRAM_BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
-        print("⚠️ Telegram bot token not configured!")
+        log.warning('Telegram bot token not configured')
+        metrics.add('telegram_messages_total', result='skipped')
         return True
     
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{app.config['TELEGRAM_API_URL']}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": ADMIN_CHAT_ID,
         "text": message,
         "parse_mode": "HTML"
     }
     
+    started = time.perf_counter()
     try:
         response = requests.post(url, json=payload, timeout=5)
+        metrics.observe('telegram_request_duration_seconds', time.perf_counter() - started)
         if response.status_code == 200:
-            print("✅ Telegram notification sent successfully")
+            log.info('Telegram notification sent')
+            metrics.add('telegram_messages_total', result='success')
             return True
         else:
-            print(f"⚠️ Failed to send Telegram notification. Status: {response.status_code}")
+            log.warning('Failed to send Telegram notification', extra={'telegram_status': response.status_code})
+            metrics.add('telegram_messages_total', result='failure')
             return True
-    except Exception as e:
-        print(f"❌ Error sending Telegram message: {e}")
+    except Exception:
+        log.exception('Error sending Telegram message')
+        metrics.observe('telegram_request_duration_seconds', time.perf_counter() - started)
+        metrics.add('telegram_messages_total', result='error')
         return True
 
+# ================ ORDER STATE MACHINE ================
+# Legal order transitions. 'event' is the change-feed event recorded,
+# 'status' / 'payment_status' list the states an order may be in for the
+# transition to apply (None = any), 'set' holds the columns it writes and
+# 'timestamps' the columns stamped with CURRENT_TIMESTAMP.
+ORDER_TRANSITIONS = {
+    'submit_payment': {
+        'event': 'receipt_uploaded',
+        'status': ('reserved',),
+        'payment_status': ('pending',),
+        'set': {'payment_status': 'pending_verification'},
+        'timestamps': ()
+    },
+    'verify_payment': {
+        'event': 'verified',
+        'status': ('pending', 'reserved'),
+        'payment_status': ('pending_verification',),
+        'set': {'payment_verified': 1, 'payment_status': 'verified', 'status': 'confirmed'},
+        'timestamps': ('payment_verified_at',)
+    },
+    'reject_payment': {
+        'event': 'rejected',
+        'status': ('pending', 'reserved'),
+        'payment_status': ('pending_verification',),
+        'set': {'payment_verified': 0, 'payment_status': 'rejected'},
+        'timestamps': ()
+    },
+    'mark_ordered': {
+        'event': 'confirmed',
+        'status': ('reserved',),
+        'payment_status': ('verified',),
+        'set': {'status': 'confirmed'},
+        'timestamps': ()
+    },
+    'ship': {
+        'event': 'shipped',
+        'status': ('reserved', 'confirmed', 'shipped'),
+        'payment_status': None,
+        'set': {'status': 'shipped'},
+        'timestamps': ()
+    },
+    'complete': {
+        'event': 'completed',
+        'status': ('pending', 'reserved', 'confirmed', 'shipped'),
+        'payment_status': None,
+        'set': {'status': 'completed'},
+        'timestamps': ()
+    },
+    'cancel': {
+        'event': 'cancelled',
+        'status': ('pending', 'reserved', 'confirmed', 'shipped', 'completed'),
+        'payment_status': None,
+        'set': {'status': 'cancelled', 'payment_status': 'cancelled'},
+        'timestamps': ()
+    }
+}
+
+# UPDATE ... RETURNING saves the follow-up SELECT where SQLite supports it
+SQLITE_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+class OrderTransitionError(Exception):
+    """Order is missing or not in a state that allows the requested transition"""
+
+def build_transition_update(transition, **values):
+    """Build the conditional UPDATE for a transition.
+
+    Returns (sql, params); the WHERE clause only holds the state guard so callers
+    can append their own conditions (e.g. order_id).
+    """
+    rule = ORDER_TRANSITIONS[transition]
+    assignments = dict(rule['set'], **values)
+
+    set_parts = [f'{column} = ?' for column in assignments]
+    set_parts += [f'{column} = CURRENT_TIMESTAMP' for column in rule['timestamps']]
+    set_parts.append('updated_at = CURRENT_TIMESTAMP')
+    set_parts.append('version = version + 1')
+
+    guard, guard_params = transition_guard(transition)
+    sql = f"UPDATE orders SET {', '.join(set_parts)} WHERE {guard}"
+    return sql, list(assignments.values()) + guard_params
+
+def transition_guard(transition):
+    """WHERE clause (and params) matching orders the transition may apply to"""
+    rule = ORDER_TRANSITIONS[transition]
+    where_parts = []
+    params = []
+    for column in ('status', 'payment_status'):
+        allowed = rule[column]
+        if allowed:
+            where_parts.append(f"{column} IN ({','.join('?' for _ in allowed)})")
+            params.extend(allowed)
+    return ' AND '.join(where_parts) or '1', params
+
+def transition_order(order_id, transition, **values):
+    """Apply a transition to one order as a single compare-and-set UPDATE.
+
+    Returns the updated order row. Raises OrderTransitionError when the order
+    does not exist or someone else already moved it to another state.
+    """
+    sql, params = build_transition_update(transition, **values)
+    sql += ' AND order_id = ?'
+    params.append(order_id)
+
+    affects_summary = transition_affects_summary(transition)
+    if affects_summary:
+        adjust_reservation_summary('o.order_id = ?', (order_id,), -1)
+
+    if SQLITE_SUPPORTS_RETURNING:
+        rows = g.conn.execute(sql + ' RETURNING *', params).fetchall()
+        order = rows[0] if rows else None
+    else:
+        cursor = g.conn.execute(sql, params)
+        order = None
+        if cursor.rowcount == 1:
+            order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+
+    if order is None:
+        g.conn.rollback()
+        current = g.conn.execute(
+            'SELECT status, payment_status FROM orders WHERE order_id = ?', (order_id,)
+        ).fetchone()
+        if not current:
+            raise OrderTransitionError('Order not found')
+        raise OrderTransitionError(
+            f"Order is {current['status']} / {current['payment_status']}; "
+            f"cannot {transition.replace('_', ' ')}"
+        )
+
+    if affects_summary:
+        adjust_reservation_summary('o.order_id = ?', (order_id,), 1)
+    record_order_events(ORDER_TRANSITIONS[transition]['event'], [order])
+    g.conn.commit()
+    return order
+
+# ================ ORDER CHANGE FEED ================
+# Fields copied into each event so admin pages can update without a refetch
+ORDER_EVENT_FIELDS = ('customer_name', 'total_price', 'status', 'payment_status')
+ORDER_EVENT_RETENTION = 5000
+ORDER_STREAM_POLL_SECONDS = 1.0
+ORDER_STREAM_HEARTBEAT_SECONDS = 15
+# Streams end after a while so EventSource reconnects and workers get recycled
+ORDER_STREAM_MAX_SECONDS = 300
+# Each open stream holds a worker thread (render.yaml runs 8 per worker), so
+# only this many stream at once; further tabs poll /admin/orders/changes
+ORDER_STREAM_MAX_OPEN = 2
+ORDER_POLL_SECONDS = 10
+_order_stream_slots = threading.BoundedSemaphore(ORDER_STREAM_MAX_OPEN)
+
+def record_order_events(event, orders, conn=None):
+    """Append change-feed events in the caller's transaction (caller commits)"""
+    conn = conn or g.conn
+    rows = []
+    for order in orders:
+        order_keys = order.keys()
+        payload = {field: order[field] for field in ORDER_EVENT_FIELDS if field in order_keys}
+        rows.append((order['order_id'] if 'order_id' in order_keys else None, event, json.dumps(payload)))
+
+    if not rows:
+        return
+
+    conn.executemany(
+        'INSERT INTO order_events (order_id, event, payload) VALUES (?, ?, ?)', rows
+    )
+
+    # Keep the feed bounded; clients only ever need the recent tail
+    last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+    if last_id % 500 < len(rows):
+        conn.execute('DELETE FROM order_events WHERE id <= ?', (last_id - ORDER_EVENT_RETENTION,))
+
+# ================ RESERVATION SUMMARY ================
+# reservation_summary holds the production list pre-aggregated: one row per
+# (product, order status) over verified orders. Writers call
+# adjust_reservation_summary(-1) for the orders they touch before changing
+# them and adjust_reservation_summary(+1) afterwards, in the same
+# transaction, so the report never has to scan order history.
+RESERVATION_SUMMARY_SCOPE = "o.payment_status = 'verified'"
+
+def adjust_reservation_summary(order_filter, params=(), sign=1, conn=None):
+    """Add (sign=1) or remove (sign=-1) the verified orders matching order_filter"""
+    conn = conn or g.conn
+    conn.execute(f'''
+        INSERT INTO reservation_summary
+            (product_id, status, total_quantity, total_weight, total_cost, order_count)
+        SELECT oi.product_id, o.status,
+               ? * SUM(oi.quantity),
+               ? * SUM(oi.weight * oi.quantity),
+               ? * SUM(oi.price * oi.quantity),
+               ? * COUNT(DISTINCT oi.order_id)
+        FROM order_items oi
+        JOIN orders o ON o.order_id = oi.order_id
+        WHERE {RESERVATION_SUMMARY_SCOPE} AND ({order_filter})
+        GROUP BY oi.product_id, o.status
+        ON CONFLICT (product_id, status) DO UPDATE SET
+            total_quantity = total_quantity + excluded.total_quantity,
+            total_weight = total_weight + excluded.total_weight,
+            total_cost = total_cost + excluded.total_cost,
+            order_count = order_count + excluded.order_count
+    ''', (sign, sign, sign, sign, *params))
+
+    if sign < 0:
+        conn.execute('DELETE FROM reservation_summary WHERE order_count <= 0')
+
+def rebuild_reservation_summary(conn=None):
+    """Recompute reservation_summary from scratch (caller commits)"""
+    conn = conn or g.conn
+    conn.execute('DELETE FROM reservation_summary')
+    adjust_reservation_summary('1', conn=conn)
+
+def transition_affects_summary(transition):
+    """True when orders entering or leaving the transition can be verified"""
+    rule = ORDER_TRANSITIONS[transition]
+    return (rule['payment_status'] is None
+            or 'verified' in rule['payment_status']
+            or rule['set'].get('payment_status') == 'verified')
+
+# ================ ROW MODELS ================
+# Slotted objects for the rows the busiest pages render. One model object
+# replaces a sqlite3.Row plus the dict (or two) it used to be copied into,
+# and templates read its attributes directly. Item access, get() and keys()
+# still work, so code written against rows and dicts needs no changes.
+# A column missing from __slots__ raises AttributeError, so new columns
+# have to be added here.
+class RowModel:
+    """Base class for slotted row models; unselected columns are left unset"""
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """sqlite3 row_factory building one model object per row"""
+        model = cls.__new__(cls)
+        for column, value in zip(cursor.description, row):
+            setattr(model, column[0], value)
+        return model
+
+    @classmethod
+    def fetch_all(cls, conn, sql, params=()):
+        """Run a query and return its rows as model objects"""
+        cursor = conn.cursor()
+        cursor.row_factory = cls.row_factory
+        return cursor.execute(sql, params).fetchall()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return [name for name in self.__slots__ if hasattr(self, name)]
+
+class Order(RowModel):
+    __slots__ = ('id', 'order_id', 'customer_name', 'contact_number', 'total_price', 'shipping_fee',
+                 'address', 'postcode', 'state', 'region', 'status', 'payment_method',
+                 'payment_status', 'payment_receipt', 'payment_verified', 'payment_verified_at',
+                 'payment_verified_by', 'tracking_number', 'version', 'created_at', 'updated_at',
+                 # filled in by the page building it
+                 'item_count', 'order_items', 'items', 'total_weight')
+
+class OrderItem(RowModel):
+    __slots__ = ('id', 'order_id', 'product_id', 'product_name', 'quantity', 'price', 'weight')
+
+class Product(RowModel):
+    __slots__ = ('id', 'name', 'price', 'weight', 'image_url', 'created_at',
+                 # sales ranking and report totals
+                 'total_sold', 'order_count', 'rank', 'emoji',
+                 'total_quantity', 'total_weight', 'total_cost')
+
 # ================ USER ROUTES ================
 
 @app.route('/')
@@ -308,7 +1811,7 @@ def index():
 @app.route('/user/products')
 def user_products():
     """Display products to user sorted by sales"""
-    products = g.conn.execute('''
+    products = Product.fetch_all(g.conn, '''
         SELECT p.*, 
                COALESCE(SUM(oi.quantity), 0) as total_sold,
                COALESCE(COUNT(DISTINCT oi.order_id), 0) as order_count
@@ -316,71 +1819,74 @@ def user_products():
         LEFT JOIN order_items oi ON p.id = oi.product_id
         GROUP BY p.id
         ORDER BY total_sold DESC, order_count DESC, p.name
-    ''').fetchall()
+    ''')
     
-    ranked_products = []
     for i, product in enumerate(products, 1):
-        product_dict = dict(product)
-        product_dict['rank'] = i
+        product.rank = i
         
         # Generate default emoji if no image
-        if not product_dict.get('image_url'):
-            product_name_lower = product_dict['name'].lower()
+        if not product.image_url:
+            product_name_lower = product.name.lower()
             if "floss" in product_name_lower:
-                product_dict['emoji'] = '🍞'
+                product.emoji = '🍞'
             elif "crab" in product_name_lower:
-                product_dict['emoji'] = '🦀'
+                product.emoji = '🦀'
             elif "seaweed" in product_name_lower:
-                product_dict['emoji'] = '🌿'
+                product.emoji = '🌿'
             elif "cracker" in product_name_lower:
-                product_dict['emoji'] = '🍘'
+                product.emoji = '🍘'
             elif "vegie" in product_name_lower:
-                product_dict['emoji'] = '🥬'
+                product.emoji = '🥬'
             elif "muruku" in product_name_lower:
-                product_dict['emoji'] = '🥨'
+                product.emoji = '🥨'
             elif "roll" in product_name_lower:
-                product_dict['emoji'] = '🍥'
+                product.emoji = '🍥'
             elif "spicy" in product_name_lower:
-                product_dict['emoji'] = '🌶️'
+                product.emoji = '🌶️'
             elif "peanut" in product_name_lower:
-                product_dict['emoji'] = '🥜'
+                product.emoji = '🥜'
             elif "choco" in product_name_lower:
-                product_dict['emoji'] = '🍫'
+                product.emoji = '🍫'
             elif "pineapple" in product_name_lower:
-                product_dict['emoji'] = '🍍'
+                product.emoji = '🍍'
             elif "soy" in product_name_lower:
-                product_dict['emoji'] = '🥠'
+                product.emoji = '🥠'
             else:
-                product_dict['emoji'] = '🥮'
-        
-        ranked_products.append(product_dict)
+                product.emoji = '🥮'
     
-    return render_template('user_products.html', products=ranked_products)
+    return render_template('user_products.html', products=products)
 
 @app.route('/user/cart/add', methods=['POST'])
 def add_to_cart():
     """Add selected products to cart and go directly to checkout"""
     cart_items = []
+    quantities = {}
     
     for key, value in request.form.items():
         if key.startswith('quantity_'):
             product_id = key.replace('quantity_', '')
             quantity = int(value) if value else 0
             
-            if quantity > 0:
-                product = g.conn.execute(
-                    'SELECT * FROM products WHERE id = ?', 
-                    (product_id,)
-                ).fetchone()
-                
-                if product:
-                    cart_items.append({
-                        'id': product['id'],
-                        'name': product['name'],
-                        'price': product['price'],
-                        'weight': product['weight'],
-                        'quantity': quantity
-                    })
+            if quantity > 0 and product_id.isdigit():
+                quantities[int(product_id)] = quantity
+    
+    # Look up every selected product in one query
+    if quantities:
+        placeholders = ','.join('?' for _ in quantities)
+        products = {product['id']: product for product in g.conn.execute(
+            f'SELECT * FROM products WHERE id IN ({placeholders})', list(quantities)
+        )}
+        
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product:
+                cart_items.append({
+                    'id': product['id'],
+                    'name': product['name'],
+                    'price': product['price'],
+                    'weight': product['weight'],
+                    'quantity': quantity
+                })
     
     session['cart'] = {str(item['id']): item for item in cart_items}
     
@@ -472,6 +1978,13 @@ def user_checkout():
                 ''', (order_id, item['id'], item['name'], 
                       item['quantity'], item['price'], item['weight']))
             
+            record_order_events('reserved', [{
+                'order_id': order_id,
+                'customer_name': customer_name,
+                'total_price': total_price,
+                'status': 'reserved',
+                'payment_status': 'pending'
+            }])
             g.conn.commit()
             
             # Send Telegram notification
@@ -488,7 +2001,7 @@ def user_checkout():
             return redirect(url_for('reservation_complete', order_id=order_id))
             
         except Exception as e:
-            print(f"Error processing order: {e}")
+            log.exception('Error processing order')
             return render_template('user_checkout.html', 
                                  cart_items=cart_items, 
                                  subtotal=subtotal,
@@ -627,7 +2140,8 @@ def payment_page(order_id):
         
         try:
             file.save(filepath)
-            print(f"✅ Receipt saved: {filename}")
+            record_upload('receipt', filepath)
+            log.info('Receipt saved', extra={'receipt': filename})
             
             if not os.path.exists(filepath):
                 return render_template('payment_page.html',
@@ -638,7 +2152,7 @@ def payment_page(order_id):
                                      error="Failed to save receipt. Please try again.")
             
         except Exception as e:
-            print(f"❌ Error saving file: {e}")
+            log.exception('Error saving receipt file')
             return render_template('payment_page.html',
                                  order=order,
                                  items=items,
@@ -648,18 +2162,19 @@ def payment_page(order_id):
         
         # Update order with payment method and receipt
         try:
-            g.conn.execute('''
-                UPDATE orders 
-                SET payment_method = ?, 
-                    payment_status = 'pending_verification',
-                    payment_receipt = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE order_id = ?
-            ''', (payment_method, filename, order_id))
-            g.conn.commit()
-            
+            transition_order(order_id, 'submit_payment',
+                             payment_method=payment_method,
+                             payment_receipt=filename)
+
+        except OrderTransitionError:
+            # Order was cancelled or paid while the customer was uploading
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return render_template('payment_not_available.html',
+                                 order=order,
+                                 message="This order is no longer available for payment.")
         except Exception as e:
-            print(f"❌ Database error: {e}")
+            log.exception('Database error recording receipt')
             if os.path.exists(filepath):
                 try:
                     os.remove(filepath)
@@ -685,8 +2200,8 @@ def payment_page(order_id):
             message += f"\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
             
             send_telegram_message(message)
-        except Exception as e:
-            print(f"⚠️ Telegram notification failed: {e}")
+        except Exception:
+            log.exception('Telegram notification failed')
         
         # Show success page
         return render_template('payment_submitted.html',
@@ -735,39 +2250,36 @@ def admin_logout():
 @admin_required
 def admin_dashboard():
     """Admin dashboard"""
-    # Get counts for dashboard
-    product_count = g.conn.execute('SELECT COUNT(*) FROM products').fetchone()[0]
-    order_count = g.conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    # Aggregates read from one read-only snapshot
+    db = read_snapshot()
     
-    # Get pending payments
-    pending_payments = g.conn.execute(
-        'SELECT COUNT(*) FROM orders WHERE payment_status = "pending_verification"'
-    ).fetchone()[0]
+    # Get counts for dashboard (the sidebar reuses them)
+    stats = admin_quick_stats(db)
     
     # Get recent orders
-    recent_orders = g.conn.execute('''
+    recent_orders = db.execute('''
         SELECT * FROM orders 
         ORDER BY created_at DESC 
         LIMIT 10
     ''').fetchall()
     
     # Get orders awaiting verification
-    orders_to_verify = g.conn.execute('''
+    orders_to_verify = db.execute('''
         SELECT * FROM orders 
         WHERE payment_status = 'pending_verification'
         ORDER BY created_at DESC
     ''').fetchall()
     
     # Get total revenue
-    total_revenue_result = g.conn.execute(
+    total_revenue_result = db.execute(
         'SELECT SUM(total_price) FROM orders WHERE payment_verified = 1'
     ).fetchone()
     total_revenue = total_revenue_result[0] if total_revenue_result[0] else 0
     
     return render_template('admin_dashboard.html', 
-                          product_count=product_count,
-                          order_count=order_count,
-                          pending_payments=pending_payments,
+                          product_count=stats['product_count'],
+                          order_count=stats['order_count'],
+                          pending_payments=stats['pending_count'],
                           recent_orders=recent_orders,
                           orders_to_verify=orders_to_verify,
                           total_revenue=total_revenue)
@@ -814,6 +2326,7 @@ def add_product():
                     # Save the file
                     try:
                         image_file.save(filepath)
+                        record_upload('product_image', filepath)
                         image_url = new_filename
                     except Exception as e:
                         return render_template('add_product.html', 
@@ -880,6 +2393,7 @@ def edit_product(id):
                     # Save the file
                     try:
                         image_file.save(filepath)
+                        record_upload('product_image', filepath)
                         current_image = new_filename
                     except Exception as e:
                         return render_template('edit_product.html', 
@@ -931,8 +2445,8 @@ def delete_product(id):
 def admin_orders():
     """View all orders"""
     orders = g.conn.execute('''
-        SELECT o.*, 
-               (SELECT COUNT(*) FROM order_items WHERE order_id = o.order_id) as item_count
+        SELECT o.*,
+               (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.order_id) as item_count
         FROM orders o 
         ORDER BY o.created_at DESC
     ''').fetchall()
@@ -956,6 +2470,34 @@ def order_details(order_id):
     
     return render_template('order_details.html', order=order, items=items)
 
+# Macros in order_macros.html that can be re-rendered on their own
+ORDER_DETAIL_FRAGMENTS = ('order_status_alert', 'payment_info_card', 'order_timeline', 'order_actions')
+ORDER_FRAGMENTS = ORDER_DETAIL_FRAGMENTS + ('verify_payment_card',)
+
+def render_order_fragments(order, names):
+    """Render order fragments by macro name for the client to swap in place"""
+    return {name: str(get_template_attribute('order_macros.html', name)(order)) for name in names}
+
+@app.route('/admin/orders/<order_id>/fragment/<name>')
+@admin_required
+def order_fragment(order_id, name):
+    """Render a single order card or panel instead of the whole page"""
+    if name not in ORDER_FRAGMENTS:
+        return 'Unknown fragment', 404
+    
+    orders = Order.fetch_all(g.conn, 'SELECT * FROM orders WHERE order_id = ?', (order_id,))
+    
+    if not orders:
+        return '', 404
+    order = orders[0]
+    
+    if name == 'verify_payment_card':
+        order.order_items = OrderItem.fetch_all(
+            g.conn, 'SELECT * FROM order_items WHERE order_id = ?', (order_id,)
+        )
+    
+    return render_order_fragments(order, [name])[name]
+
 @app.route('/admin/orders/send_payment_link/<order_id>')
 @admin_required
 def send_payment_link(order_id):
@@ -988,26 +2530,12 @@ def send_payment_link(order_id):
 @admin_required
 def verify_payment(order_id):
     """Verify payment and update order status"""
-    order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
-    
-    if not order:
-        return jsonify({'success': False, 'message': 'Order not found'})
-    
     action = request.form.get('action')
     
     if action == 'verify':
         try:
-            g.conn.execute('''
-                UPDATE orders 
-                SET payment_verified = 1, 
-                    payment_status = 'verified',
-                    status = 'confirmed',
-                    payment_verified_at = CURRENT_TIMESTAMP,
-                    payment_verified_by = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE order_id = ?
-            ''', (session.get('admin_username', 'admin'), order_id))
-            g.conn.commit()
+            order = transition_order(order_id, 'verify_payment',
+                                     payment_verified_by=session.get('admin_username', 'admin'))
             
             # Generate WhatsApp message for admin to send
             whatsapp_message = f"Hi {order['customer_name']}, your payment for Order {order_id} has been verified. We will proceed with shipping within 3 working days. Thank you!"
@@ -1036,8 +2564,10 @@ def verify_payment(order_id):
                 'customer_name': order['customer_name'],
                 'order_id': order_id
             })
+        except OrderTransitionError as e:
+            return jsonify({'success': False, 'message': str(e)})
         except Exception as e:
-            print(f"Error verifying payment: {e}")
+            log.exception('Error verifying payment')
             return jsonify({'success': False, 'message': f'Error: {str(e)}'})
     
     elif action == 'reject':
@@ -1045,14 +2575,7 @@ def verify_payment(order_id):
         reason = reason.replace('#', '').strip()
         
         try:
-            g.conn.execute('''
-                UPDATE orders 
-                SET payment_verified = 0, 
-                    payment_status = 'rejected',
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE order_id = ?
-            ''', (order_id,))
-            g.conn.commit()
+            order = transition_order(order_id, 'reject_payment')
             
             # Generate WhatsApp message for rejection
             whatsapp_message = f"Hi {order['customer_name']}, your payment for Order {order_id} was rejected. Reason: {reason}. Please contact us for assistance."
@@ -1078,8 +2601,10 @@ def verify_payment(order_id):
                 'customer_name': order['customer_name'],
                 'order_id': order_id
             })
+        except OrderTransitionError as e:
+            return jsonify({'success': False, 'message': str(e)})
         except Exception as e:
-            print(f"Error rejecting payment: {e}")
+            log.exception('Error rejecting payment')
             return jsonify({'success': False, 'message': f'Error: {str(e)}'})
     
     return jsonify({'success': False, 'message': 'Invalid action'})
@@ -1088,61 +2613,164 @@ def verify_payment(order_id):
 @admin_required
 def admin_verify_payments():
     """Payment verification page"""
-    orders_result = g.conn.execute('''
+    orders = Order.fetch_all(g.conn, '''
         SELECT * FROM orders 
         WHERE payment_status = 'pending_verification'
         ORDER BY created_at DESC
-    ''').fetchall()
+    ''')
+    
+    # Items for every pending order in one query, grouped by order
+    items_by_order = {}
+    for item in OrderItem.fetch_all(g.conn, '''
+        SELECT * FROM order_items 
+        WHERE order_id IN (SELECT order_id FROM orders WHERE payment_status = 'pending_verification')
+        ORDER BY id
+    '''):
+        items_by_order.setdefault(item.order_id, []).append(item)
     
-    orders_with_items = []
-    for order in orders_result:
-        order_dict = dict(order)
-        items_result = g.conn.execute(
-            'SELECT * FROM order_items WHERE order_id = ?', 
-            (order['order_id'],)
-        ).fetchall()
-        items_list = [dict(item) for item in items_result]
-        order_dict['order_items'] = items_list
-        orders_with_items.append(order_dict)
-    
-    pending_payments = len(orders_with_items)
+    for order in orders:
+        order.order_items = items_by_order.get(order.order_id, [])
+    
+    pending_payments = len(orders)
     
     return render_template('admin_verify_payments.html', 
-                         orders=orders_with_items,
+                         orders=orders,
                          pending_payments=pending_payments)
 
+def admin_quick_stats(conn=None):
+    """Product, order and pending-payment counts for the admin sidebar, one query per request"""
+    if 'quick_stats' not in g:
+        g.quick_stats = (conn or g.conn).execute('''
+            SELECT (SELECT COUNT(*) FROM products) AS product_count,
+                   (SELECT COUNT(*) FROM orders) AS order_count,
+                   (SELECT COUNT(*) FROM orders WHERE payment_status = 'pending_verification') AS pending_count
+        ''').fetchone()
+    return g.quick_stats
+
 @app.context_processor
 def inject_pending_payments():
-    """Inject pending payments count into all templates"""
-    if hasattr(g, 'conn'):
-        pending_count = g.conn.execute(
-            'SELECT COUNT(*) FROM orders WHERE payment_status = "pending_verification"'
-        ).fetchone()[0]
-        return dict(pending_payments=pending_count)
+    """Inject the sidebar counts into admin templates (customer pages never show them)"""
+    if hasattr(g, 'conn') and request.path.startswith('/admin'):
+        stats = admin_quick_stats()
+        return dict(pending_payments=stats['pending_count'], quick_stats=stats)
     return dict(pending_payments=0)
 
+def order_changes_since(conn, last_id, limit=100):
+    """Change-feed deltas after event last_id, each with the current pending count"""
+    events = conn.execute(
+        'SELECT * FROM order_events WHERE id > ? ORDER BY id LIMIT ?', (last_id, limit)
+    ).fetchall()
+    if not events:
+        return []
+    
+    pending_count = conn.execute(
+        "SELECT COUNT(*) FROM orders WHERE payment_status = 'pending_verification'"
+    ).fetchone()[0]
+    
+    changes = []
+    for event in events:
+        delta = json.loads(event['payload'] or '{}')
+        delta.update(id=event['id'],
+                     event=event['event'],
+                     order_id=event['order_id'],
+                     pending_payments=pending_count)
+        changes.append(delta)
+    return changes
+
+def latest_order_event_id(conn):
+    """ID of the newest change-feed event (0 when empty)"""
+    return conn.execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+
+@app.route('/admin/orders/stream')
+@admin_required
+def order_stream():
+    """Server-Sent Events feed of order changes for open admin pages"""
+    # 204 tells EventSource to stop reconnecting; the page falls back to polling
+    if not _order_stream_slots.acquire(blocking=False):
+        return '', 204
+    
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('since', type=int)
+
+    def generate(last_id):
+        # Own connection: the request's g.conn is closed once the view returns
+        conn = get_db_connection()
+        try:
+            if last_id is None:
+                last_id = latest_order_event_id(conn)
+
+            yield 'retry: 3000\n\n'
+
+            data_version = None
+            started = last_sent = time.monotonic()
+
+            while time.monotonic() - started < ORDER_STREAM_MAX_SECONDS:
+                # data_version only changes when another connection commits,
+                # so idle tabs never touch the order tables
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+
+                if version != data_version:
+                    data_version = version
+                    changes = order_changes_since(conn, last_id)
+
+                    for change in changes:
+                        yield f"id: {change['id']}\nevent: order\ndata: {json.dumps(change)}\n\n"
+
+                    if changes:
+                        last_id = changes[-1]['id']
+                        last_sent = time.monotonic()
+
+                        # Full batch: more may be waiting, don't wait for the next commit
+                        if len(changes) == 100:
+                            data_version = None
+                            continue
+
+                if time.monotonic() - last_sent >= ORDER_STREAM_HEARTBEAT_SECONDS:
+                    yield ': keepalive\n\n'
+                    last_sent = time.monotonic()
+
+                time.sleep(ORDER_STREAM_POLL_SECONDS)
+        finally:
+            conn.close()
+
+    response = Response(generate(last_event_id),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if the body never started
+    response.call_on_close(_order_stream_slots.release)
+    return response
+
+@app.route('/admin/orders/changes')
+@admin_required
+def order_changes():
+    """Short-poll fallback for order_stream when every stream slot is taken"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'success': True, 'last_id': latest_order_event_id(g.conn),
+                        'changes': [], 'poll_seconds': ORDER_POLL_SECONDS})
+    
+    changes = order_changes_since(g.conn, since)
+    return jsonify({
+        'success': True,
+        'last_id': changes[-1]['id'] if changes else since,
+        'changes': changes,
+        'poll_seconds': ORDER_POLL_SECONDS
+    })
+
 @app.route('/admin/orders/add_tracking/<order_id>', methods=['POST'])
 @admin_required
 def add_tracking_number(order_id):
     """Add tracking number to order"""
-    order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
-    
-    if not order:
-        return jsonify({'success': False, 'message': 'Order not found'})
-    
     tracking_number = request.form.get('tracking_number')
     
     if not tracking_number:
         return jsonify({'success': False, 'message': 'Tracking number required'})
     
-    g.conn.execute('''
-        UPDATE orders 
-        SET tracking_number = ?, 
-            status = 'shipped',
-            updated_at = CURRENT_TIMESTAMP
-        WHERE order_id = ?
-    ''', (tracking_number, order_id))
-    g.conn.commit()
+    try:
+        order = transition_order(order_id, 'ship', tracking_number=tracking_number)
+    except OrderTransitionError as e:
+        return jsonify({'success': False, 'message': str(e)})
     
     # Send Telegram notification
         
@@ -1154,8 +2782,129 @@ def add_tracking_number(order_id):
     message += f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
     
     send_telegram_message(message)
-    
-    return jsonify({'success': True, 'message': 'Tracking number added successfully'})
+
+    return jsonify({
+        'success': True,
+        'message': 'Tracking number added successfully',
+        'fragments': render_order_fragments(order, ORDER_DETAIL_FRAGMENTS)
+    })
+
+def parse_tracking_import(text):
+    """Parse courier CSV / pasted lines into (order_id, tracking_number) pairs"""
+    pairs = []
+    errors = []
+
+    for line_no, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        # Accept comma, tab or whitespace separated columns
+        if len(row) == 1:
+            row = re.split(r'[\t ]+', row[0].strip())
+        row = [col.strip() for col in row if col.strip()]
+
+        if not row:
+            continue
+
+        # Skip header line from courier exports
+        if line_no == 1 and not row[0].upper().startswith('EF'):
+            continue
+
+        if len(row) < 2:
+            errors.append(f"Line {line_no}: expected order ID and tracking number")
+            continue
+
+        pairs.append((row[0].upper(), row[1]))
+
+    return pairs, errors
+
+@app.route('/admin/orders/import_tracking', methods=['GET', 'POST'])
+@admin_required
+def import_tracking_numbers():
+    """Bulk import tracking numbers from courier CSV or pasted text"""
+    if request.method == 'GET':
+        return render_template('import_tracking.html')
+
+    text = request.form.get('tracking_data', '')
+    if 'tracking_file' in request.files and request.files['tracking_file'].filename != '':
+        text = request.files['tracking_file'].read().decode('utf-8-sig', errors='replace')
+
+    pairs, errors = parse_tracking_import(text)
+
+    if not pairs:
+        return render_template('import_tracking.html',
+                             tracking_data=text,
+                             errors=errors,
+                             error='No order ID / tracking number pairs found')
+
+    # Last line wins if an order appears more than once
+    tracking_by_order = dict(pairs)
+
+    # Validate every order ID in one query
+    placeholders = ','.join('?' for _ in tracking_by_order)
+    orders = g.conn.execute(f'''
+        SELECT order_id, customer_name, contact_number, status
+        FROM orders
+        WHERE order_id IN ({placeholders})
+    ''', list(tracking_by_order)).fetchall()
+    found_ids = {order['order_id'] for order in orders}
+    for order_id in tracking_by_order:
+        if order_id not in found_ids:
+            errors.append(f"{order_id}: order not found")
+
+    # Only orders the state machine allows to ship
+    orders_by_id = {}
+    for order in orders:
+        if order['status'] in ORDER_TRANSITIONS['ship']['status']:
+            orders_by_id[order['order_id']] = order
+        else:
+            errors.append(f"{order['order_id']}: order is {order['status']}")
+
+    if orders_by_id:
+        updates = []
+        for order_id in orders_by_id:
+            sql, params = build_transition_update('ship', tracking_number=tracking_by_order[order_id])
+            updates.append(params + [order_id])
+        shipped_filter = f"o.order_id IN ({','.join('?' for _ in orders_by_id)})"
+        adjust_reservation_summary(shipped_filter, list(orders_by_id), -1)
+        g.conn.executemany(sql + ' AND order_id = ?', updates)
+        adjust_reservation_summary(shipped_filter, list(orders_by_id), 1)
+        record_order_events('shipped', [
+            dict(order, status='shipped') for order in orders_by_id.values()
+        ])
+        g.conn.commit()
+
+    # Build customer WhatsApp links from the shipping template in one pass
+    shipping_template = get_settings().get('shipping_message') or ''
+    shipped = []
+    for order_id, order in orders_by_id.items():
+        tracking_number = tracking_by_order[order_id]
+        whatsapp_message = format_setting_message(
+            shipping_template,
+            customer_name=order['customer_name'],
+            order_id=order_id,
+            tracking_number=tracking_number
+        )
+        shipped.append({
+            'order_id': order_id,
+            'customer_name': order['customer_name'],
+            'tracking_number': tracking_number,
+            'whatsapp_link': f"https://wa.me/6{order['contact_number']}?text={urllib.parse.quote(whatsapp_message)}"
+        })
+
+    # Single summary notification for the whole batch
+    if shipped:
+        message = f"🚚 *BULK TRACKING IMPORT*\n\n"
+        message += f"📦 {len(shipped)} orders marked as shipped\n"
+        for item in shipped:
+            message += f"• {item['order_id']} ({item['customer_name']}): {item['tracking_number']}\n"
+        if errors:
+            message += f"\n⚠️ {len(errors)} lines skipped\n"
+        message += f"👨‍💼 Imported by: {session.get('admin_username', 'admin')}\n"
+        message += f"⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+        send_telegram_message(message)
+
+    return render_template('import_tracking.html',
+                         shipped=shipped,
+                         errors=errors)
 
 @app.route('/admin/settings', methods=['GET', 'POST'])
 @admin_required
@@ -1223,12 +2972,15 @@ def delete_order(order_id):
     if not order:
         return redirect(url_for('admin_orders'))
     
+    adjust_reservation_summary('o.order_id = ?', (order_id,), -1)
+    
     # Delete order items first (foreign key constraint)
     g.conn.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
     
     # Delete order
     g.conn.execute('DELETE FROM orders WHERE order_id = ?', (order_id,))
     
+    record_order_events('deleted', [order])
     g.conn.commit()
     
     # Send Telegram notification
@@ -1248,22 +3000,11 @@ def delete_order(order_id):
 @admin_required
 def cancel_order(order_id):
     """Cancel an order (change status to cancelled)"""
-    order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
-    
-    if not order:
+    try:
+        order = transition_order(order_id, 'cancel')
+    except OrderTransitionError:
         return redirect(url_for('admin_orders'))
     
-    # Update order status to cancelled
-    g.conn.execute('''
-        UPDATE orders 
-        SET status = 'cancelled', 
-            payment_status = 'cancelled',
-            updated_at = CURRENT_TIMESTAMP
-        WHERE order_id = ?
-    ''', (order_id,))
-    
-    g.conn.commit()
-    
     # Send Telegram notification
     message = f"❌ *ORDER CANCELLED*\n\n"
     message += f"📦 Order ID: {order_id}\n"
@@ -1305,8 +3046,22 @@ def edit_order(order_id):
                                  states=STATE_REGIONS['west'] + STATE_REGIONS['east'],
                                  error='Please enter a valid contact number (10-11 digits)')
         
+        # Only overwrite the order if nobody changed it since the form was loaded
+        expected_version = request.form.get('expected_version', order['version'], type=int)
+        
+        fields = {
+            'customer_name': customer_name,
+            'contact_number': contact_number,
+            'address': address,
+            'postcode': postcode,
+            'status': status,
+            'payment_status': payment_status,
+            'tracking_number': tracking_number
+        }
+        
         # Determine region if state changed
         if state and state != order['state']:
+            fields['state'] = state
             region = 'west' if state in STATE_REGIONS['west'] else 'east'
             # Update shipping fee if region changed
             if region != order['region']:
@@ -1314,36 +3069,33 @@ def edit_order(order_id):
                 # Recalculate total price
                 items = g.conn.execute('SELECT * FROM order_items WHERE order_id = ?', (order_id,)).fetchall()
                 subtotal = sum(item['price'] * item['quantity'] for item in items)
-                total_price = subtotal + shipping_fee
-                
-                g.conn.execute('''
-                    UPDATE orders 
-                    SET customer_name = ?, contact_number = ?, address = ?, postcode = ?, 
-                        state = ?, region = ?, shipping_fee = ?, total_price = ?,
-                        status = ?, payment_status = ?, tracking_number = ?,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE order_id = ?
-                ''', (customer_name, contact_number, address, postcode, state, region, 
-                      shipping_fee, total_price, status, payment_status, tracking_number, order_id))
-            else:
-                g.conn.execute('''
-                    UPDATE orders 
-                    SET customer_name = ?, contact_number = ?, address = ?, postcode = ?, 
-                        state = ?, status = ?, payment_status = ?, tracking_number = ?,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE order_id = ?
-                ''', (customer_name, contact_number, address, postcode, state, 
-                      status, payment_status, tracking_number, order_id))
-        else:
-            g.conn.execute('''
-                UPDATE orders 
-                SET customer_name = ?, contact_number = ?, address = ?, postcode = ?, 
-                    status = ?, payment_status = ?, tracking_number = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE order_id = ?
-            ''', (customer_name, contact_number, address, postcode, 
-                  status, payment_status, tracking_number, order_id))
+                fields['region'] = region
+                fields['shipping_fee'] = shipping_fee
+                fields['total_price'] = subtotal + shipping_fee
+        
+        set_clause = ', '.join(f'{column} = ?' for column in fields)
+        # Status and payment status are free-form here, so re-bucket the order
+        adjust_reservation_summary('o.order_id = ?', (order_id,), -1)
+        cursor = g.conn.execute(f'''
+            UPDATE orders 
+            SET {set_clause}, updated_at = CURRENT_TIMESTAMP, version = version + 1
+            WHERE order_id = ? AND version = ?
+        ''', list(fields.values()) + [order_id, expected_version])
+        
+        if cursor.rowcount == 0:
+            g.conn.rollback()
+            order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+            if not order:
+                return redirect(url_for('admin_orders'))
+            items = g.conn.execute('SELECT * FROM order_items WHERE order_id = ?', (order_id,)).fetchall()
+            return render_template('edit_order.html', 
+                                 order=order, 
+                                 items=items,
+                                 states=STATE_REGIONS['west'] + STATE_REGIONS['east'],
+                                 error='This order was changed by someone else. Review the latest details and save again.'), 409
         
+        adjust_reservation_summary('o.order_id = ?', (order_id,), 1)
+        record_order_events('updated', [dict(fields, order_id=order_id)])
         g.conn.commit()
         
         # Send Telegram notification
@@ -1373,21 +3125,11 @@ def edit_order(order_id):
 @admin_required
 def complete_order(order_id):
     """Mark order as completed"""
-    order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
-    
-    if not order:
+    try:
+        order = transition_order(order_id, 'complete')
+    except OrderTransitionError:
         return redirect(url_for('admin_orders'))
     
-    # Update order status to completed
-    g.conn.execute('''
-        UPDATE orders 
-        SET status = 'completed', 
-            updated_at = CURRENT_TIMESTAMP
-        WHERE order_id = ?
-    ''', (order_id,))
-    
-    g.conn.commit()
-    
     # Send Telegram notification
     message = f"✅ *ORDER COMPLETED*\n\n"
     message += f"📦 Order ID: {order_id}\n"
@@ -1423,53 +3165,98 @@ def edit_order_items(order_id):
     
     if request.method == 'POST':
         try:
-            # Start transaction
-            g.conn.execute('BEGIN TRANSACTION')
+            expected_version = request.form.get('expected_version', order['version'], type=int)
+            items_by_product = {item['product_id']: item for item in current_items}
             
-            # Delete all current items
-            g.conn.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
-            
-            # Get new items from form
+            # Work out which lines changed before opening the write transaction
+            inserts = []
+            updates = []
+            deletes = []
             new_items = []
             subtotal = 0
-            total_weight = 0
             
             for product in products:
-                quantity_key = f'quantity_{product["id"]}'
-                quantity = request.form.get(quantity_key, '0')
+                quantity = request.form.get(f'quantity_{product["id"]}', '0')
+                quantity = int(quantity) if quantity else 0
+                existing = items_by_product.pop(product['id'], None)
                 
-                if quantity and int(quantity) > 0:
-                    quantity = int(quantity)
-                    item_total = product['price'] * quantity
-                    item_weight = product['weight'] * quantity
-                    
-                    # Insert new item
-                    g.conn.execute('''
-                        INSERT INTO order_items (order_id, product_id, product_name, 
-                                               quantity, price, weight)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (order_id, product['id'], product['name'], 
-                          quantity, product['price'], product['weight']))
-                    
-                    new_items.append({
-                        'name': product['name'],
-                        'quantity': quantity,
-                        'price': product['price'],
-                        'total': item_total
-                    })
-                    subtotal += item_total
-                    total_weight += item_weight
+                if quantity <= 0:
+                    if existing:
+                        deletes.append((existing['id'],))
+                    continue
+                
+                price = product['price']
+                if existing:
+                    # Saving reprices every line at today's catalogue values
+                    if (existing['quantity'] != quantity or existing['price'] != price
+                            or existing['product_name'] != product['name']
+                            or existing['weight'] != product['weight']):
+                        updates.append((product['name'], quantity, price,
+                                        product['weight'], existing['id']))
+                else:
+                    inserts.append((order_id, product['id'], product['name'],
+                                    quantity, price, product['weight']))
+                
+                new_items.append({
+                    'name': product['name'],
+                    'quantity': quantity,
+                    'price': price,
+                    'total': price * quantity
+                })
+                subtotal += price * quantity
+            
+            # Lines for products no longer in the catalogue are dropped
+            deletes.extend((item['id'],) for item in items_by_product.values())
             
             # Update order total
             shipping_fee = SHIPPING_RATES[order['region']]
             total_price = subtotal + shipping_fee
             
-            g.conn.execute('''
+            # Version check first so a stale form fails before touching any items
+            cursor = g.conn.execute('''
                 UPDATE orders 
-                SET total_price = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE order_id = ?
-            ''', (total_price, order_id))
+                SET total_price = ?, updated_at = CURRENT_TIMESTAMP, version = version + 1
+                WHERE order_id = ? AND version = ?
+            ''', (total_price, order_id, expected_version))
+            
+            if cursor.rowcount == 0:
+                g.conn.rollback()
+                order = g.conn.execute('SELECT * FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+                current_items = g.conn.execute(
+                    'SELECT oi.*, p.image_url FROM order_items oi '
+                    'LEFT JOIN products p ON oi.product_id = p.id '
+                    'WHERE oi.order_id = ?', 
+                    (order_id,)
+                ).fetchall()
+                return render_template('edit_order_items.html',
+                                     order=order,
+                                     current_items=current_items,
+                                     products=products,
+                                     error='This order was changed by someone else. Review the latest items and save again.'), 409
+            
+            # Verified orders are in the reservation summary; swap their old lines for the new
+            items_changed = deletes or updates or inserts
+            if items_changed:
+                adjust_reservation_summary('o.order_id = ?', (order_id,), -1)
             
+            if deletes:
+                g.conn.executemany('DELETE FROM order_items WHERE id = ?', deletes)
+            if updates:
+                g.conn.executemany('''
+                    UPDATE order_items
+                    SET product_name = ?, quantity = ?, price = ?, weight = ?
+                    WHERE id = ?
+                ''', updates)
+            if inserts:
+                g.conn.executemany('''
+                    INSERT INTO order_items (order_id, product_id, product_name, 
+                                           quantity, price, weight)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', inserts)
+            if items_changed:
+                adjust_reservation_summary('o.order_id = ?', (order_id,), 1)
+            
+            record_order_events('updated', [dict(order, total_price=total_price)])
             g.conn.commit()
             
             # Telegram notification
@@ -1495,8 +3282,8 @@ def edit_order_items(order_id):
             return redirect(url_for('order_details', order_id=order_id))
             
         except Exception as e:
-            g.conn.execute('ROLLBACK')
-            print(f"Error updating order items: {e}")
+            g.conn.rollback()
+            log.exception('Error updating order items')
             error_msg = f'Error updating items: {str(e)}'
             return render_template('edit_order_items.html',
                                  order=order,
@@ -1509,6 +3296,264 @@ def edit_order_items(order_id):
                          current_items=current_items,
                          products=products)
 
+# Rows pulled from SQLite per round trip while streaming reports
+REPORT_FETCH_SIZE = 500
+
+def iter_rows(cursor, size=REPORT_FETCH_SIZE):
+    """Yield cursor rows in fetchmany batches instead of one big fetchall"""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+def parse_report_period(args):
+    """Read a date range or ISO week batch from the query string.
+
+    Returns {'start', 'end', 'label'} with 'end' exclusive (None = open ended),
+    or None for the all-time report. Raises ValueError on malformed dates.
+    """
+    batch = args.get('batch', '').strip()
+    start = args.get('start', '').strip()
+    end = args.get('end', '').strip()
+    
+    if batch:
+        # 2026-W42 -> Monday of that week up to the following Monday
+        start_date = datetime.strptime(batch + '-1', '%G-W%V-%u').date()
+        end_date = start_date + timedelta(days=7)
+        return {'start': start_date.isoformat(), 'end': end_date.isoformat(),
+                'batch': batch, 'label': f'Batch {batch}'}
+    
+    if not start and not end:
+        return None
+    
+    start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else None
+    end_date = datetime.strptime(end, '%Y-%m-%d').date() if end else None
+    if start_date and end_date and end_date < start_date:
+        raise ValueError('End date is before start date')
+    
+    return {
+        'start': start_date.isoformat() if start_date else '',
+        'end': (end_date + timedelta(days=1)).isoformat() if end_date else None,
+        'label': f"{start_date or '…'} to {end_date or 'now'}"
+    }
+
+def find_report_scope(conn, period=None):
+    """Pick the orders the report covers.
+
+    Returns (order filter, params, summary bucket filter, order count). The
+    bucket filter is None for date-scoped reports, which reservation_summary
+    cannot answer.
+    """
+    range_filter = ''
+    params = []
+    if period:
+        # Matches idx_orders_payment_status_created_at
+        range_filter = ' AND o.created_at >= ?'
+        params.append(period['start'])
+        if period['end']:
+            range_filter += ' AND o.created_at < ?'
+            params.append(period['end'])
+    
+    # Try different combinations to find the right orders
+    order_filter = """
+        (o.status = 'reserved' OR o.status = 'Reserved') 
+        AND o.payment_status IN ('verified', 'Verified')
+    """ + range_filter
+    total_orders = conn.execute(f"SELECT COUNT(*) FROM orders o WHERE {order_filter}", params).fetchone()[0]
+    if total_orders:
+        return order_filter, params, None if period else "rs.status IN ('reserved', 'Reserved')", total_orders
+    
+    # If no orders found with exact match, try broader search
+    order_filter = "o.payment_status = 'verified'" + range_filter
+    total_orders = conn.execute(f"SELECT COUNT(*) FROM orders o WHERE {order_filter}", params).fetchone()[0]
+    return order_filter, params, None if period else '1', total_orders
+
+def query_report_products(conn, bucket_filter):
+    """Product totals for the report, read from the matching reservation_summary buckets"""
+    return conn.execute(f"""
+        SELECT 
+            rs.product_id AS id,
+            p.name,
+            p.image_url,
+            p.price,
+            p.weight,
+            SUM(rs.total_quantity) AS total_quantity,
+            SUM(rs.total_weight) AS total_weight,
+            SUM(rs.total_cost) AS total_cost,
+            SUM(rs.order_count) AS order_count
+        FROM reservation_summary rs
+        JOIN products p ON rs.product_id = p.id
+        WHERE {bucket_filter}
+        GROUP BY rs.product_id
+        HAVING SUM(rs.order_count) > 0
+        ORDER BY total_quantity DESC
+    """)
+
+def query_period_products(conn, order_filter, params):
+    """Product totals for a date-scoped report, aggregated from the orders in range"""
+    return conn.execute(f"""
+        SELECT 
+            oi.product_id AS id,
+            p.name,
+            p.image_url,
+            p.price,
+            p.weight,
+            SUM(oi.quantity) AS total_quantity,
+            SUM(oi.weight * oi.quantity) AS total_weight,
+            SUM(oi.price * oi.quantity) AS total_cost,
+            COUNT(DISTINCT oi.order_id) AS order_count
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.order_id
+        JOIN products p ON oi.product_id = p.id
+        WHERE {order_filter}
+        GROUP BY oi.product_id
+        ORDER BY total_quantity DESC
+    """, params)
+
+def query_scope_products(conn, order_filter, params, bucket_filter):
+    """Product totals for whichever scope find_report_scope picked"""
+    if bucket_filter is None:
+        return query_period_products(conn, order_filter, params)
+    return query_report_products(conn, bucket_filter)
+
+# Receipts for a period's last orders are usually verified a few days after
+# it ends, so a period is only frozen once this many days have passed
+REPORT_SNAPSHOT_GRACE_DAYS = 7
+
+def load_report_snapshot(conn, period, totals):
+    """Frozen (summary, products, streamed orders) for a closed period, or None"""
+    row = conn.execute(
+        'SELECT summary, products, order_count, created_at FROM report_snapshots '
+        'WHERE period_start = ? AND period_end = ?',
+        (period['start'], period['end'])
+    ).fetchone()
+    if not row or row['order_count'] is None:
+        return None
+    summary = json.loads(row['summary'])
+    summary['snapshot_at'] = row['created_at']
+    cursor = conn.execute('''
+        SELECT order_id, customer_name, contact_number, created_at, total_price,
+               product_name, quantity, price, unit_weight
+        FROM report_snapshot_lines
+        WHERE period_start = ? AND period_end = ?
+        ORDER BY id
+    ''', (period['start'], period['end']))
+    return summary, json.loads(row['products']), group_report_orders(cursor, totals)
+
+def freeze_report_snapshot(conn, period):
+    """Copy a closed period's totals and order lines into report_snapshots.
+
+    Runs as one write transaction, so totals and lines match, and the lines
+    are copied by SQLite without passing through Python. The first complete
+    snapshot wins. Returns False when the period has no orders to freeze.
+    """
+    begin_immediate(conn)
+    try:
+        order_filter, params, bucket_filter, total_orders = find_report_scope(conn, period)
+        if not total_orders:
+            conn.rollback()
+            return False
+        products = query_scope_products(conn, order_filter, params, bucket_filter).fetchall()
+        cursor = conn.execute('''
+            INSERT INTO report_snapshots (period_start, period_end, summary, products, order_count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (period_start, period_end) DO UPDATE SET
+                summary = excluded.summary,
+                products = excluded.products,
+                order_count = excluded.order_count,
+                created_at = CURRENT_TIMESTAMP
+            WHERE report_snapshots.order_count IS NULL
+        ''', (period['start'], period['end'], json.dumps(report_summary(total_orders, products)),
+              json.dumps([dict(product) for product in products]), total_orders))
+        if cursor.rowcount:
+            conn.execute('DELETE FROM report_snapshot_lines WHERE period_start = ? AND period_end = ?',
+                         (period['start'], period['end']))
+            conn.execute(f'''
+                INSERT INTO report_snapshot_lines
+                    (period_start, period_end, order_id, customer_name, contact_number, created_at,
+                     total_price, product_name, quantity, price, unit_weight)
+                SELECT ?, ?, {REPORT_LINE_COLUMNS}
+                {report_lines_from(order_filter)}
+            ''', [period['start'], period['end']] + params)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+def period_is_closed(period):
+    """A period is closed REPORT_SNAPSHOT_GRACE_DAYS after its (exclusive, UTC) end date"""
+    closed_until = datetime.utcnow().date() - timedelta(days=REPORT_SNAPSHOT_GRACE_DAYS)
+    return bool(period and period['end'] and period['end'] <= closed_until.isoformat())
+
+def report_summary(total_orders, products):
+    """Report header totals from the product summary"""
+    return {
+        'total_orders': total_orders,
+        'total_items': sum(p['total_quantity'] for p in products),
+        'total_weight': sum(p['total_weight'] for p in products),
+        'total_cost': sum(p['total_cost'] for p in products),
+        'date': datetime.now().strftime('%Y-%m-%d')
+    }
+
+# One row per order line, as iter_report_orders reads them and snapshots store them
+REPORT_LINE_COLUMNS = '''
+    o.order_id, o.customer_name, o.contact_number, o.created_at, o.total_price,
+    oi.product_name, oi.quantity, oi.price,
+    COALESCE(p.weight, oi.weight) AS unit_weight
+'''
+
+def report_lines_from(order_filter):
+    """FROM ... ORDER BY part of the report's order-line query"""
+    return f"""
+        FROM orders o
+        LEFT JOIN order_items oi ON oi.order_id = o.order_id
+        LEFT JOIN products p ON oi.product_id = p.id
+        WHERE {order_filter}
+        ORDER BY o.created_at DESC, o.order_id, oi.id
+    """
+
+def iter_report_orders(conn, order_filter, totals, params=()):
+    """Yield the live report's orders with their items one at a time"""
+    cursor = conn.execute(f'SELECT {REPORT_LINE_COLUMNS} {report_lines_from(order_filter)}', params)
+    yield from group_report_orders(cursor, totals)
+
+def group_report_orders(cursor, totals):
+    """Group order-line rows into orders as they stream past, tallying totals"""
+    # Rows arrive grouped by order, so each order is complete when its group ends
+    for order_id, rows in itertools.groupby(iter_rows(cursor), key=lambda row: row['order_id']):
+        items = []
+        total_order_weight = 0
+        
+        for row in rows:
+            order = row
+            if row['quantity'] is None:
+                continue
+            unit_weight = float(row['unit_weight'])
+            items.append(OrderItem(
+                product_name=row['product_name'],
+                quantity=row['quantity'],
+                price=float(row['price']),
+                weight=unit_weight
+            ))
+            total_order_weight += unit_weight * row['quantity']
+        
+        totals['orders'] += 1
+        totals['item_lines'] += len(items)
+        totals['weight'] += total_order_weight
+        
+        yield Order(
+            order_id=order_id,
+            customer_name=order['customer_name'],
+            contact_number=order['contact_number'],
+            created_at=order['created_at'],
+            item_count=len(items),
+            total_price=float(order['total_price']),
+            total_weight=total_order_weight,
+            items=items
+        )
+
 @app.route('/admin/reservation_report')
 @admin_required
 def reservation_report():
@@ -1516,202 +3561,87 @@ def reservation_report():
     from datetime import datetime
     
     try:
-        # Connect to your database
-        conn = get_db_connection()
+        started = time.perf_counter()
         
-        # Find reserved and verified orders
-        cursor = conn.cursor()
+        # Consistent read-only snapshot; checkouts keep writing meanwhile
+        conn = read_snapshot()
         
-        # Try different combinations to find the right orders
-        cursor.execute("""
-            SELECT * FROM orders 
-            WHERE (status = 'reserved' OR status = 'Reserved') 
-            AND (payment_status = 'verified' OR payment_status = 'Verified')
-            ORDER BY created_at DESC
-        """)
-        reserved_orders_raw = cursor.fetchall()
-        
-        # If no orders found with exact match, try broader search
-        if not reserved_orders_raw:
-            cursor.execute("""
-                SELECT * FROM orders 
-                WHERE payment_status = 'verified'
-                ORDER BY created_at DESC
-            """)
-            reserved_orders_raw = cursor.fetchall()
-        
-        # Debug: Print what we found
-        print(f"Found {len(reserved_orders_raw)} verified orders")
-        
-        # If still no orders, return empty report
-        if not reserved_orders_raw:
-            summary = {
-                'total_orders': 0,
-                'total_items': 0,
-                'total_weight': 0.0,
-                'total_cost': 0.0,
-                'date': datetime.now().strftime('%Y-%m-%d'),
-                'note': 'No verified orders found. Make sure orders have payment_status="verified"'
-            }
-            return render_template('product_reservation_report_final.html',
-                                 product_summary=[],
-                                 reserved_orders=[],
-                                 summary=summary)
-        
-        # Convert all SQLite Row objects to dictionaries
-        reserved_orders = []
-        for row in reserved_orders_raw:
-            order_dict = {}
-            for key in row.keys():
-                order_dict[key] = row[key]
-            reserved_orders.append(order_dict)
-        
-        # Get order IDs for the query
-        order_ids = [order['order_id'] for order in reserved_orders]
-        
-        # Get all order items with product info
-        placeholders = ','.join('?' for _ in order_ids)
-        
-        cursor.execute(f"""
-            SELECT 
-                oi.*, 
-                p.name as product_name, 
-                p.price as unit_price, 
-                p.weight as unit_weight,
-                p.image_url
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.id
-            WHERE oi.order_id IN ({placeholders})
-        """, order_ids)
-        
-        all_order_items_raw = cursor.fetchall()
-        
-        # Convert all order items to dictionaries
-        all_order_items = []
-        for row in all_order_items_raw:
-            item_dict = {}
-            for key in row.keys():
-                item_dict[key] = row[key]
-            all_order_items.append(item_dict)
-        
-        # Group order items by order_id for faster lookup
-        order_items_by_order = {}
-        for item in all_order_items:
-            order_id = item['order_id']
-            if order_id not in order_items_by_order:
-                order_items_by_order[order_id] = []
-            order_items_by_order[order_id].append(item)
-        
-        print(f"Found {len(all_order_items)} order items across {len(order_ids)} orders")
-        
-        # Calculate product summary (aggregate across all orders)
-        product_summary = {}
-        
-        for order in reserved_orders:
-            order_id = order['order_id']
-            items = order_items_by_order.get(order_id, [])
+        try:
+            period = parse_report_period(request.args)
+        except ValueError as e:
+            period = None
+            period_error = f'Invalid date range: {e}'
+        else:
+            period_error = None
+        
+        # Closed periods are served entirely from their frozen snapshot, the
+        # order list streamed like the live one
+        stream_totals = {'orders': 0, 'item_lines': 0, 'weight': 0.0}
+        snapshot = load_report_snapshot(conn, period, stream_totals) if period_is_closed(period) else None
+        if snapshot is None and period_is_closed(period) and freeze_report_snapshot(g.conn, period):
+            # Our read snapshot predates the freeze; read it back through g.conn
+            snapshot = load_report_snapshot(g.conn, period, stream_totals)
+        if snapshot:
+            summary, product_summary_list, reserved_orders = snapshot
+            query_done = aggregate_done = time.perf_counter()
+        else:
+            # Find reserved and verified orders
+            order_filter, params, bucket_filter, total_orders = find_report_scope(conn, period)
             
-            for item in items:
-                product_id = item['product_id']
-                
-                if product_id not in product_summary:
-                    product_summary[product_id] = {
-                        'id': product_id,
-                        'name': item['product_name'],
-                        'image_url': item['image_url'],
-                        'price': float(item['unit_price']),
-                        'weight': float(item['unit_weight']),
-                        'total_quantity': 0,
-                        'total_weight': 0.0,
-                        'total_cost': 0.0,
-                        'orders': []
-                    }
-                
-                # Add to totals
-                product_summary[product_id]['total_quantity'] += item['quantity']
-                product_summary[product_id]['total_weight'] += float(item['unit_weight']) * item['quantity']
-                product_summary[product_id]['total_cost'] += float(item['unit_price']) * item['quantity']
-                
-                # Check if this order is already in the list for this product
-                existing_order = next(
-                    (o for o in product_summary[product_id]['orders'] 
-                     if o['order_id'] == order_id), 
-                    None
-                )
-                
-                if existing_order:
-                    # Update quantity if order already exists
-                    existing_order['quantity'] += item['quantity']
-                else:
-                    # Add new order entry
-                    product_summary[product_id]['orders'].append({
-                        'order_id': order_id,
-                        'customer_name': order['customer_name'],
-                        'contact_number': order['contact_number'],
-                        'quantity': item['quantity'],
-                        'created_at': order['created_at'][:10] if order['created_at'] else ''
-                    })
-        
-        # Convert to list
-        product_summary_list = list(product_summary.values())
-        
-        # Calculate totals
-        total_items = sum(p['total_quantity'] for p in product_summary_list)
-        total_weight = sum(p['total_weight'] for p in product_summary_list)
-        total_cost = sum(p['total_cost'] for p in product_summary_list)
-        
-        # Prepare orders with items
-        orders_with_items = []
-        for order in reserved_orders:
-            order_id = order['order_id']
-            items_list = order_items_by_order.get(order_id, [])
+            log.debug('Report scope', extra={'period': period, 'total_orders': total_orders})
             
-            # Convert items to proper dictionary format
-            order_items_formatted = []
-            total_order_weight = 0
+            # If still no orders, return empty report
+            if not total_orders:
+                summary = {
+                    'total_orders': 0,
+                    'total_items': 0,
+                    'total_weight': 0.0,
+                    'total_cost': 0.0,
+                    'date': datetime.now().strftime('%Y-%m-%d'),
+                    'note': 'No verified orders found. Make sure orders have payment_status="verified"'
+                }
+                return render_template('product_reservation_report_final.html',
+                                     product_summary=[],
+                                     reserved_orders=[],
+                                     summary=summary,
+                                     period=period,
+                                     period_error=period_error)
             
-            for item in items_list:
-                order_items_formatted.append({
-                    'product_name': item['product_name'],
-                    'quantity': item['quantity'],
-                    'price': float(item['price']),
-                    'weight': float(item['unit_weight'])
-                })
-                total_order_weight += float(item['unit_weight']) * item['quantity']
+            # All-time totals come pre-aggregated from reservation_summary;
+            # date-scoped ones are summed over the orders in range
+            cursor = query_scope_products(conn, order_filter, params, bucket_filter)
+            cursor.row_factory = Product.row_factory
+            product_summary_list = cursor.fetchall()
+            query_done = time.perf_counter()
             
-            # Create order dictionary
-            order_dict = {
-                'order_id': order['order_id'],
-                'customer_name': order['customer_name'],
-                'contact_number': order['contact_number'],
-                'created_at': order['created_at'],
-                'item_count': len(items_list),
-                'total_price': float(order['total_price']),
-                'total_weight': total_order_weight,
-                'items': order_items_formatted
-            }
-            orders_with_items.append(order_dict)
+            # Calculate totals
+            summary = report_summary(total_orders, product_summary_list)
+            aggregate_done = time.perf_counter()
+            
+            # The per-order section is streamed: orders are read in batches and
+            # rendered as they arrive, so memory stays flat however many there are
+            reserved_orders = iter_report_orders(conn, order_filter, stream_totals, params)
         
-        summary = {
-            'total_orders': len(reserved_orders),
-            'total_items': total_items,
-            'total_weight': total_weight,
-            'total_cost': total_cost,
-            'date': datetime.now().strftime('%Y-%m-%d')
-        }
+        summary['query_ms'] = (query_done - started) * 1000
+        summary['aggregate_ms'] = (aggregate_done - query_done) * 1000
         
-        # For debugging
-        print(f"Summary: {summary}")
-        print(f"Product summary count: {len(product_summary_list)}")
-        print(f"Orders with items count: {len(orders_with_items)}")
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Report summary', extra={'summary': summary, 'product_count': len(product_summary_list)})
         
-        # Use the final template
-        return render_template('product_reservation_report_final.html',
+        # Timing breakdown shows up in the browser's network panel
+        return stream_template('product_reservation_report_final.html',
                              product_summary=product_summary_list,
-                             reserved_orders=orders_with_items,
-                             summary=summary)
+                             reserved_orders=reserved_orders,
+                             stream_totals=stream_totals,
+                             summary=summary,
+                             period=period,
+                             period_error=period_error), {'Server-Timing': (
+            f"db;dur={summary['query_ms']:.1f}, "
+            f"aggregate;dur={summary['aggregate_ms']:.1f}"
+        )}
         
     except Exception as e:
+        log.exception('Error generating report')
         import traceback
         error_details = traceback.format_exc()
         
@@ -1732,13 +3662,57 @@ def reservation_report():
         <a href="{url_for('admin_dashboard')}" class="btn btn-primary">Back to Dashboard</a>
         """, 500
 
+@app.route('/admin/sql_stats')
+@admin_required
+def sql_stats():
+    """Per-endpoint query counts and DB time for this worker, busiest first"""
+    with _sql_stats_lock:
+        endpoints = [
+            dict(stats, endpoint=endpoint,
+                 avg_queries=round(stats['queries'] / stats['requests'], 2),
+                 avg_db_ms=round(stats['db_ms'] / stats['requests'], 2))
+            for endpoint, stats in sql_endpoint_stats.items()
+        ]
+    endpoints.sort(key=lambda stats: stats['db_ms'], reverse=True)
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'endpoints': endpoints,
+        'query_problems': list(recent_query_problems)
+    })
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """Recent request profiles with their hottest functions and SQL"""
+    return render_template('admin_profiles.html', profiles=load_profiles())
+
+@app.route('/admin/profiles/<profile_id>.prof')
+@admin_required
+def download_profile(profile_id):
+    """Raw cProfile stats for snakeviz / pstats"""
+    return send_from_directory(os.path.abspath(app.config['PROFILE_DIR']),
+                               f'{secure_filename(profile_id)}.prof', as_attachment=True)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint, totals across all workers (admin or bearer token)"""
+    token = app.config.get('METRICS_TOKEN')
+    authorized = 'admin_logged_in' in session or (
+        token and request.headers.get('Authorization') == f'Bearer {token}'
+    )
+    if not authorized:
+        return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+    return Response(render_metrics(app.config['METRICS_DIR']),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/admin/check_db')
 @admin_required
 def check_db():
     """Simple route to check database status"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        cursor = read_snapshot().cursor()
         
         # Check tables
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
@@ -1800,15 +3774,8 @@ def check_db():
 @admin_required
 def reservation_report_debug():
     """Debug version that shows raw data"""
-    import sqlite3
-    from datetime import datetime
-    
     try:
-        # Connect to database
-        db_path = 'instance/reserve_cart.db'  # Adjust if different
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = read_snapshot().cursor()
         
         # Get all data for debugging
         cursor.execute("SELECT * FROM orders ORDER BY created_at DESC")
@@ -1827,8 +3794,6 @@ def reservation_report_debug():
         cursor.execute("SELECT DISTINCT payment_status FROM orders")
         payment_status_values = [row['payment_status'] for row in cursor.fetchall()]
         
-        conn.close()
-        
         return render_template('reservation_report_debug.html',
                              all_orders=all_orders,
                              all_items=all_items,
@@ -1952,28 +3917,114 @@ def reservation_report_orm(Order, Product, OrderItem):
                          reserved_orders=orders_with_items,
                          summary=summary)
 
+# Orders moved per transaction; the write lock is released between chunks
+BULK_CHUNK_SIZE = 200
+
+def run_bulk_transition(transition, started_by=None, chunk_size=BULK_CHUNK_SIZE):
+    """Apply a transition to every matching order in primary-key chunks.
+
+    Each chunk commits on its own, together with the job's progress in
+    bulk_jobs, so checkouts can get the write lock between chunks and an
+    interrupted run picks up after the last committed order. A resumed run
+    then starts over from the first order, since orders below the saved
+    position may have become eligible meanwhile; the job is done once a pass
+    from the start finds nothing left. Returns the job row and this run's
+    per-chunk timings.
+    """
+    job = g.conn.execute(
+        "SELECT * FROM bulk_jobs WHERE transition = ? AND status = 'running' ORDER BY id LIMIT 1",
+        (transition,)
+    ).fetchone()
+    if job:
+        log.info('Resuming bulk job', extra={'job_id': job['id'], 'transition': transition,
+                                            'last_order_id': job['last_order_id']})
+    else:
+        job_id = g.conn.execute(
+            'INSERT INTO bulk_jobs (transition, started_by) VALUES (?, ?)', (transition, started_by)
+        ).lastrowid
+        g.conn.commit()
+        job = g.conn.execute('SELECT * FROM bulk_jobs WHERE id = ?', (job_id,)).fetchone()
+    
+    guard, guard_params = transition_guard(transition)
+    update_sql, update_params = build_transition_update(transition)
+    rule = ORDER_TRANSITIONS[transition]
+    affects_summary = transition_affects_summary(transition)
+    last_order_id = job['last_order_id']
+    pass_start = last_order_id
+    chunks = []
+    
+    while True:
+        chunk_started = time.perf_counter()
+        # Take the write lock before reading so the chunk can't change under us
+        begin_immediate(g.conn)
+        orders = g.conn.execute(f'''
+            SELECT * FROM orders 
+            WHERE {guard} AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', guard_params + [last_order_id, chunk_size]).fetchall()
+        
+        if not orders and pass_start:
+            # End of a resumed pass: rescan the orders before where it started
+            last_order_id = pass_start = 0
+            g.conn.execute(
+                'UPDATE bulk_jobs SET last_order_id = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (job['id'],)
+            )
+            g.conn.commit()
+            continue
+        
+        if not orders:
+            g.conn.execute(
+                "UPDATE bulk_jobs SET status = 'done', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (job['id'],)
+            )
+            g.conn.commit()
+            break
+        
+        ids = [order['id'] for order in orders]
+        placeholders = ','.join('?' for _ in ids)
+        
+        if affects_summary:
+            adjust_reservation_summary(f'o.id IN ({placeholders})', ids, -1)
+        g.conn.execute(update_sql + f' AND id IN ({placeholders})', update_params + ids)
+        if affects_summary:
+            adjust_reservation_summary(f'o.id IN ({placeholders})', ids, 1)
+        
+        # One audit event per order rather than a single anonymous bulk event
+        record_order_events(rule['event'], [dict(order, **rule['set']) for order in orders])
+        
+        last_order_id = ids[-1]
+        g.conn.execute('''
+            UPDATE bulk_jobs 
+            SET last_order_id = ?, processed = processed + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (last_order_id, len(ids), job['id']))
+        g.conn.commit()
+        
+        elapsed = time.perf_counter() - chunk_started
+        chunks.append({
+            'orders': len(ids),
+            'ms': round(elapsed * 1000, 1),
+            'orders_per_second': round(len(ids) / elapsed)
+        })
+        log.info('Bulk job batch', extra={'job_id': job['id'], 'transition': transition, 'orders': len(ids),
+                                          'last_order_id': last_order_id, 'batch_ms': round(elapsed * 1000, 1)})
+    
+    job = g.conn.execute('SELECT * FROM bulk_jobs WHERE id = ?', (job['id'],)).fetchone()
+    return job, chunks
+
 @app.route('/admin/mark_reserved_as_ordered', methods=['POST'])
 @admin_required
 def mark_reserved_as_ordered():
     """Mark reserved products as ordered (update status)"""
     try:
-        # Update order status from 'reserved' to 'confirmed' using SQL
-        conn = get_db_connection()
-        
-        # Update orders
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE orders 
-            SET status = 'confirmed'
-            WHERE status = 'reserved' 
-            AND payment_status = 'verified'
-        """)
-        
-        updated_count = cursor.rowcount
-        conn.commit()
+        # Update order status from 'reserved' to 'confirmed' in resumable chunks
+        job, chunks = run_bulk_transition('mark_ordered', started_by=session.get('admin_username', 'admin'))
+        # job['processed'] also counts orders moved by earlier, interrupted runs
+        updated_count = sum(chunk['orders'] for chunk in chunks)
         
-        # Log the action
-        print(f"Marked {updated_count} reserved orders as ordered")
+        log.info('Marked reserved orders as ordered', extra={'orders': updated_count})
         
         # Send Telegram notification
         message = f"✅ *RESERVED ORDERS MARKED AS ORDERED*\n\n"
@@ -1986,25 +4037,209 @@ def mark_reserved_as_ordered():
         return jsonify({
             'success': True,
             'message': f'Marked {updated_count} orders as ordered',
-            'updated': updated_count
+            'updated': updated_count,
+            'job_id': job['id'],
+            'chunks': chunks
         })
         
     except Exception as e:
+        g.conn.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+# Column layouts shared by the CSV and XLSX exports
+EXPORT_PRODUCT_HEADER = ['Product ID', 'Product', 'Quantity', 'Weight (kg)', 'Unit Price', 'Total Cost', 'Orders']
+EXPORT_ORDER_HEADER = ['Order ID', 'Customer', 'Contact', 'Created', 'Product', 'Quantity',
+                       'Price', 'Line Total', 'Weight (kg)', 'Order Total']
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def iter_export_product_rows(products):
+    """Product summary rows for export"""
+    for product in products:
+        yield [product['id'], product['name'], product['total_quantity'],
+               round(product['total_weight'], 3), product['price'],
+               round(product['total_cost'], 2), product['order_count']]
+
+def iter_export_order_rows(orders):
+    """One row per order line, streamed order by order"""
+    for order in orders:
+        for item in order['items']:
+            yield [order['order_id'], order['customer_name'], order['contact_number'],
+                   order['created_at'], item['product_name'], item['quantity'],
+                   item['price'], round(item['price'] * item['quantity'], 2),
+                   round(item['weight'] * item['quantity'], 3), order['total_price']]
+
+def iter_csv(sections):
+    """Stream (title, header, rows) sections as CSV text"""
+    buffer = io.StringIO()
+    # BOM so Excel opens the Chinese product names as UTF-8
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    for index, (title, header, rows) in enumerate(sections):
+        if index:
+            writer.writerow([])
+        writer.writerow([title])
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 16384:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+class ZipStream:
+    """Write-only file object for zipfile that hands written bytes back out.
+
+    It has no seek(), so zipfile writes data descriptors after each member
+    and never needs to go back - the archive can be sent as it is built.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def xlsx_cell(value):
+    """One SpreadsheetML cell; strings are written inline so no shared string table is needed"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = XML_ILLEGAL_CHARS.sub('', '' if value is None else str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{xml_escape(text)}</t></is></c>'
+
+def iter_xlsx(sheets):
+    """Stream (name, header, rows) sheets as an .xlsx workbook, one zip chunk at a time"""
+    main_ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel_ns = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    sheet_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{n}.xml" ContentType="{sheet_type}"/>'
+            for n in range(1, len(sheets) + 1)
+        )
+        workbook.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{overrides}</Types>'
+        ))
+        workbook.writestr('_rels/.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'<Relationship Id="rId1" Type="{rel_ns}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+        workbook.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<workbook xmlns="{main_ns}" xmlns:r="{rel_ns}"><sheets>'
+            + ''.join(f'<sheet name="{xml_escape(name)}" sheetId="{n}" r:id="rId{n}"/>'
+                      for n, (name, _, _) in enumerate(sheets, 1))
+            + '</sheets></workbook>'
+        ))
+        workbook.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(f'<Relationship Id="rId{n}" Type="{rel_ns}/worksheet" Target="worksheets/sheet{n}.xml"/>'
+                      for n in range(1, len(sheets) + 1))
+            + '</Relationships>'
+        ))
+        yield stream.drain()
+
+        for n, (name, header, rows) in enumerate(sheets, 1):
+            # force_zip64: the sheet size is unknown until all rows are written
+            with workbook.open(f'xl/worksheets/sheet{n}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write((
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    f'<worksheet xmlns="{main_ns}"><sheetData>'
+                    f'<row>{"".join(xlsx_cell(value) for value in header)}</row>'
+                ).encode('utf-8'))
+                for row in rows:
+                    sheet.write(f'<row>{"".join(xlsx_cell(value) for value in row)}</row>'.encode('utf-8'))
+                    if len(stream.chunks) > 32:
+                        yield stream.drain()
+                sheet.write(b'</sheetData></worksheet>')
+            yield stream.drain()
+
+    # Central directory is written on close
+    yield stream.drain()
+
 @app.route('/admin/export/reservation_report/<format>')
 @admin_required
 def export_reservation_report(format):
-    """Export reservation report in various formats"""
-    # Similar logic to reservation_report() but export as CSV/PDF
-    # Implementation depends on your export library
-    pass
+    """Export reservation report as CSV or Excel, streamed straight from the database"""
+    if format not in EXPORT_MIMETYPES:
+        return jsonify({
+            'success': False,
+            'message': f'Unsupported export format: {format}'
+        }), 400
+    
+    try:
+        period = parse_report_period(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid date range: {e}'
+        }), 400
+    
+    conn = read_snapshot()
+    totals = {'orders': 0, 'item_lines': 0, 'weight': 0.0}
+    # Closed periods export the same frozen snapshot the report page shows
+    snapshot = load_report_snapshot(conn, period, totals) if period_is_closed(period) else None
+    if snapshot is None and period_is_closed(period) and freeze_report_snapshot(g.conn, period):
+        snapshot = load_report_snapshot(g.conn, period, totals)
+    if snapshot:
+        summary, products, orders = snapshot
+    else:
+        order_filter, params, bucket_filter, total_orders = find_report_scope(conn, period)
+        products = iter_rows(query_scope_products(conn, order_filter, params, bucket_filter))
+        orders = iter_report_orders(conn, order_filter, totals, params)
+    sections = [
+        ('Products', EXPORT_PRODUCT_HEADER, iter_export_product_rows(products)),
+        ('Orders', EXPORT_ORDER_HEADER, iter_export_order_rows(orders))
+    ]
+    body = iter_csv(sections) if format == 'csv' else iter_xlsx(sections)
+    
+    if period:
+        label = period.get('batch') or f"{period['start'] or 'start'}_{period['end'] or 'now'}"
+    else:
+        label = datetime.now().strftime('%Y-%m-%d')
+    filename = f"reservation_report_{label}.{format}"
+    return Response(stream_with_context(body),
+                    mimetype=EXPORT_MIMETYPES[format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+# ================ DEVELOPER COMMANDS ================
+# seed-synthetic, check-query-budgets, explain-queries, benchmark, load-test
+# and replay-traffic live in cli.py; importing it registers them on app.cli.
+# Not needed when app.py is run directly, which would import a second copy.
+if __name__ != '__main__':
+    import cli  # noqa: E402,F401
 
 # ================ MAIN ENTRY POINT ================
 if __name__ == '__main__':
     init_db()
     update_products_table()
+    update_orders_table()
+    update_report_snapshots_table()
+    update_reservation_summary_table()
     app.run(debug=True, port=5000)
\ No newline at end of file
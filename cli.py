@@ -0,0 +1,1135 @@
+# cli.py - Developer commands for performance work (flask --app app <command>)
+"""Synthetic data, query budget and plan checks, benchmarks, load tests and
+traffic replay. Registered on app.cli when app.py is imported, so every
+command runs against the app's own routes and helpers; none of this is
+needed to serve requests.
+"""
+import bisect
+import collections
+import contextlib
+import http.server
+import io
+import itertools
+import json
+import logging
+import os
+import pathlib
+import queue
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+
+import click
+import requests
+from flask import url_for
+
+from app import (
+    app, log, ensure_schema, reset_schema_check, rebuild_reservation_summary,
+    collect_sql_statements, sql_endpoint_stats, recent_query_problems, _SQL_LITERALS,
+    QUERY_BUDGETS, WORKER_THREADS, PAYMENT_METHODS, SHIPPING_RATES, STATE_REGIONS,
+    datetimeformat, format_order_reservation
+)
+
+# Reachable (status, payment_status) combinations with a rough production mix
+SYNTHETIC_ORDER_STATES = [
+    ('pending', 'pending', 1),
+    ('reserved', 'pending', 12),
+    ('reserved', 'pending_verification', 6),
+    ('reserved', 'rejected', 2),
+    ('reserved', 'verified', 15),
+    ('confirmed', 'verified', 10),
+    ('shipped', 'verified', 14),
+    ('completed', 'verified', 32),
+    ('cancelled', 'cancelled', 8)
+]
+SYNTHETIC_FIRST_NAMES = ['Aisyah', 'Ahmad', 'Mei Ling', 'Kumar', 'Siti', 'Wei Jie', 'Priya', 'Hafiz',
+                         'Nurul', 'Jason', 'Farah', 'Daniel', 'Lakshmi', 'Amir', 'Chloe', 'Zul']
+SYNTHETIC_LAST_NAMES = ['Tan', 'Abdullah', 'Lim', 'Raj', 'Wong', 'Ismail', 'Lee', 'Ng', 'Rahman', 'Chong']
+# Orders per executemany batch; the whole load is still one transaction
+SYNTHETIC_BATCH_SIZE = 10000
+# Smallest valid PNG, copied (or hard-linked) for every synthetic receipt
+RECEIPT_PLACEHOLDER = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082'
+)
+
+def zipf_cum_weights(count, exponent=1.1):
+    """Cumulative weights giving rank r probability proportional to 1 / r**exponent"""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+def write_receipt_placeholder(directory, filename):
+    """Hard-link the placeholder receipt under `filename` (copy where links fail)"""
+    placeholder = os.path.join(directory, 'synthetic_receipt.png')
+    if not os.path.exists(placeholder):
+        with open(placeholder, 'wb') as f:
+            f.write(RECEIPT_PLACEHOLDER)
+    target = os.path.join(directory, filename)
+    try:
+        os.link(placeholder, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(placeholder, target)
+
+def seed_synthetic_orders(conn, count, seed=1, until=None, days=90, receipt_dir=None):
+    """Insert `count` realistic orders with items for local measurements (caller commits).
+
+    The same seed and `until` always produce the same rows. Product
+    popularity follows a Zipf distribution over the real product list, orders
+    are spread over `days` before `until` (default: today) and across every
+    state in STATE_REGIONS. Orders that reached payment get a receipt
+    filename; placeholder files are written when `receipt_dir` is given.
+    """
+    rng = random.Random(seed)
+    # rng.random() plus bisect instead of randint/choices: the load is
+    # dominated by generating rows, not by SQLite
+    rand = rng.random
+    pick = lambda sequence: sequence[int(rand() * len(sequence))]
+    products = conn.execute('SELECT id, name, price, weight FROM products ORDER BY id').fetchall()
+    # Which product is the best seller is part of the seed too
+    products = rng.sample(products, len(products))
+    product_weights = zipf_cum_weights(len(products))
+    states = [(status, payment_status) for status, payment_status, _ in SYNTHETIC_ORDER_STATES]
+    state_weights = list(itertools.accumulate(weight for _, _, weight in SYNTHETIC_ORDER_STATES))
+    regions = [(region, state) for region, names in STATE_REGIONS.items() for state in names]
+    if until is None:
+        until = datetime.now()
+    until = until.replace(hour=0, minute=0, second=0, microsecond=0)
+    span = days * 86400
+    if receipt_dir:
+        os.makedirs(receipt_dir, exist_ok=True)
+    
+    for batch_start in range(0, count, SYNTHETIC_BATCH_SIZE):
+        orders = []
+        items = []
+        for n in range(batch_start, min(batch_start + SYNTHETIC_BATCH_SIZE, count)):
+            order_id = f'SYN{n:07d}'
+            region, state = pick(regions)
+            status, payment_status = states[bisect.bisect(state_weights, rand() * state_weights[-1])]
+            created_at = until - timedelta(seconds=1 + int(rand() * span))
+            created = created_at.isoformat(' ')
+            
+            subtotal = 0
+            chosen = dict.fromkeys(
+                products[bisect.bisect(product_weights, rand() * product_weights[-1])]
+                for _ in range(1 + int(rand() * 4))
+            )
+            for product in chosen:
+                quantity = 1 + int(rand() * 5)
+                items.append((order_id, product['id'], product['name'], quantity,
+                              product['price'], product['weight']))
+                subtotal += product['price'] * quantity
+            
+            verified = payment_status == 'verified'
+            paid = verified or payment_status in ('pending_verification', 'rejected')
+            receipt = None
+            updated = created
+            if paid:
+                receipt = f"receipt_{order_id}_{created.replace('-', '').replace(':', '').replace(' ', '_')}_synthetic.png"
+                if receipt_dir:
+                    write_receipt_placeholder(receipt_dir, receipt)
+                updated = (created_at + timedelta(seconds=3600 + int(rand() * 47 * 3600))).isoformat(' ')
+            
+            orders.append((
+                order_id,
+                f'{pick(SYNTHETIC_FIRST_NAMES)} {pick(SYNTHETIC_LAST_NAMES)}',
+                f'01{10000000 + int(rand() * 90000000)}',
+                subtotal + SHIPPING_RATES[region], SHIPPING_RATES[region],
+                f'{1 + int(rand() * 250)} Jalan {pick(SYNTHETIC_LAST_NAMES)}',
+                f'{10000 + int(rand() * 90000)}', state, region, status,
+                pick(PAYMENT_METHODS) if paid else None,
+                payment_status, receipt,
+                1 if verified else 0,
+                updated if verified else None,
+                'synthetic' if verified else None,
+                f'SYNTRK{n:07d}' if status in ('shipped', 'completed') else None,
+                created, updated
+            ))
+        
+        conn.executemany('''
+            INSERT INTO orders (order_id, customer_name, contact_number, total_price, shipping_fee,
+                                address, postcode, state, region, status, payment_method,
+                                payment_status, payment_receipt, payment_verified, payment_verified_at,
+                                payment_verified_by, tracking_number, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', orders)
+        conn.executemany('''
+            INSERT INTO order_items (order_id, product_id, product_name, quantity, price, weight)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', items)
+
+def build_synthetic_database(path, orders, seed=1, until=None, receipt_dir=None):
+    """Create the app's schema at `path` and bulk-load synthetic orders in one transaction"""
+    original = app.config['DATABASE']
+    app.config['DATABASE'] = path
+    reset_schema_check()
+    try:
+        ensure_schema()
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # Bulk load only: a crash just means running the generator again
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA cache_size = -262144')
+        conn.execute('BEGIN')
+        # Building secondary indexes once afterwards beats updating them per row
+        indexes = conn.execute('''
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ('orders', 'order_items')
+        ''').fetchall()
+        for index in indexes:
+            conn.execute(f'DROP INDEX {index["name"]}')
+        seed_synthetic_orders(conn, orders, seed=seed, until=until, receipt_dir=receipt_dir)
+        for index in indexes:
+            conn.execute(index['sql'])
+        rebuild_reservation_summary(conn)
+        conn.execute('COMMIT')
+        conn.close()
+    finally:
+        app.config['DATABASE'] = original
+        reset_schema_check()
+
+@contextlib.contextmanager
+def synthetic_database(orders, name='synthetic.db'):
+    """Point the app at a throwaway database seeded with `orders` synthetic orders.
+
+    Uploads, metrics and Telegram notifications are kept out of the live
+    setup for the duration so exercising routes has no side effects outside
+    the temp directory, and per-request log lines are silenced unless
+    LOG_LEVEL is set.
+    """
+    workdir = tempfile.mkdtemp()
+    original = {key: app.config[key] for key in ('DATABASE', 'UPLOAD_FOLDER', 'TELEGRAM_ENABLED', 'METRICS_DIR')}
+    log_level = log.level
+    
+    try:
+        build_synthetic_database(os.path.join(workdir, name), orders)
+        app.config['DATABASE'] = os.path.join(workdir, name)
+        app.config['UPLOAD_FOLDER'] = workdir
+        app.config['TELEGRAM_ENABLED'] = False
+        app.config['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+        if 'LOG_LEVEL' not in os.environ:
+            log.setLevel(logging.WARNING)  # keep per-request lines out of command output
+        reset_schema_check()
+        yield app.config['DATABASE']
+    finally:
+        app.config.update(original)
+        log.setLevel(log_level)
+        reset_schema_check()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@app.cli.command('seed-synthetic')
+@click.argument('database', type=click.Path(dir_okay=False))
+@click.option('--orders', default=300000, show_default=True, help='Orders to generate.')
+@click.option('--seed', default=1, show_default=True, help='Random seed; same seed and --until, same data.')
+@click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Newest order date (default: today).')
+@click.option('--receipts', is_flag=True,
+              help='Write placeholder receipt files to a receipts/ directory next to DATABASE.')
+@click.option('--force', is_flag=True, help='Replace DATABASE if it exists.')
+def seed_synthetic(database, orders, seed, until, receipts, force):
+    """Generate a production-sized DATABASE of synthetic orders for performance work"""
+    if os.path.exists(database):
+        if not force:
+            raise click.ClickException(f'{database} exists; use --force to replace it')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+    
+    # Never into the live UPLOAD_FOLDER: tens of thousands of placeholders
+    receipt_dir = os.path.join(os.path.dirname(os.path.abspath(database)), 'receipts') if receipts else None
+    
+    started = time.perf_counter()
+    build_synthetic_database(database, orders, seed=seed, until=until, receipt_dir=receipt_dir)
+    elapsed = time.perf_counter() - started
+    
+    conn = sqlite3.connect(database)
+    order_count = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    item_count = conn.execute('SELECT COUNT(*) FROM order_items').fetchone()[0]
+    conn.close()
+    print(f"✅ {database}: {order_count} orders, {item_count} items in {elapsed:.1f}s "
+          f"({(order_count + item_count) / elapsed:,.0f} rows/s)")
+    if receipt_dir:
+        print(f"   Run the app on it with DATABASE={database} UPLOAD_FOLDER={receipt_dir}")
+    else:
+        print(f"   Run the app on it with DATABASE={database}")
+
+def admin_test_client(username):
+    """Test client already logged in as admin"""
+    client = app.test_client()
+    with client.session_transaction() as client_session:
+        client_session['admin_logged_in'] = True
+        client_session['admin_username'] = username
+    return client
+
+def sample_order_id(conn, status, payment_status):
+    """Any synthetic order in the given state"""
+    row = conn.execute('SELECT order_id FROM orders WHERE status = ? AND payment_status = ? LIMIT 1',
+                       (status, payment_status)).fetchone()
+    return row[0] if row else None
+
+def budget_route_checks(database):
+    """(method, url, data) requests covering every endpoint in QUERY_BUDGETS"""
+    conn = sqlite3.connect(database)
+    product_ids = [row[0] for row in conn.execute('SELECT id FROM products LIMIT 3')]
+    order_id = conn.execute('SELECT order_id FROM orders LIMIT 1').fetchone()[0]
+    conn.close()
+    
+    with app.test_request_context():
+        return [
+            ('GET', url_for('user_products'), None),
+            ('POST', url_for('add_to_cart'), {f'quantity_{product_id}': '2' for product_id in product_ids}),
+            ('GET', url_for('user_checkout'), None),
+            ('GET', url_for('admin_dashboard'), None),
+            ('GET', url_for('admin_orders'), None),
+            ('GET', url_for('order_details', order_id=order_id), None),
+            ('GET', url_for('admin_verify_payments'), None),
+            ('GET', url_for('reservation_report'), None),
+            ('GET', url_for('export_reservation_report', format='csv'), None)
+        ]
+
+def audit_route_checks(database):
+    """Budget checks plus the remaining customer and admin routes, writes included"""
+    conn = sqlite3.connect(database)
+    pending = sample_order_id(conn, 'reserved', 'pending')
+    to_verify = sample_order_id(conn, 'reserved', 'pending_verification')
+    verified = sample_order_id(conn, 'reserved', 'verified')
+    to_ship, to_import = [row[0] for row in conn.execute(
+        "SELECT order_id FROM orders WHERE status = 'confirmed' AND payment_status = 'verified' LIMIT 2"
+    )]
+    shipped = sample_order_id(conn, 'shipped', 'verified')
+    to_cancel = conn.execute(
+        "SELECT order_id FROM orders WHERE status = 'reserved' AND order_id NOT IN (?, ?, ?) LIMIT 1",
+        (pending, to_verify, verified)
+    ).fetchone()[0]
+    product_ids = [row[0] for row in conn.execute('SELECT id FROM products LIMIT 2')]
+    conn.close()
+    
+    receipt = lambda: {'payment_method': 'bank_transfer',
+                       'receipt': (io.BytesIO(b'\x89PNG\r\n\x1a\n' + b'\0' * 64), 'receipt.png')}
+    with app.test_request_context():
+        return budget_route_checks(database) + [
+            ('POST', url_for('user_checkout'), {
+                'customer_name': 'Plan Audit', 'contact_number': '0123456789',
+                'address': '1 Jalan Audit', 'postcode': '50000', 'state': 'Selangor'
+            }),
+            ('GET', url_for('payment_page', order_id=pending), None),
+            ('POST', url_for('payment_page', order_id=pending), receipt()),
+            ('GET', url_for('admin_products'), None),
+            ('GET', url_for('order_fragment', order_id=to_verify, name='verify_payment_card'), None),
+            ('GET', url_for('send_payment_link', order_id=pending), None),
+            ('POST', url_for('verify_payment', order_id=to_verify), {'action': 'verify'}),
+            ('POST', url_for('add_tracking_number', order_id=to_ship), {'tracking_number': 'AUDIT0001'}),
+            ('POST', url_for('import_tracking_numbers'), {'tracking_data': f'order_id,tracking\n{to_import},AUDIT0002'}),
+            ('GET', url_for('edit_order', order_id=verified), None),
+            ('GET', url_for('edit_order_items', order_id=verified), None),
+            ('POST', url_for('edit_order_items', order_id=verified),
+             {f'quantity_{product_id}': '3' for product_id in product_ids}),
+            ('GET', url_for('cancel_order', order_id=to_cancel), None),
+            ('GET', url_for('complete_order', order_id=shipped), None),
+            ('GET', url_for('reservation_report', start=(datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')), None),
+            ('GET', url_for('export_reservation_report', format='xlsx'), None),
+            # A closed batch: freezes the snapshot, then reads it back
+            ('GET', url_for('reservation_report', batch=(datetime.now() - timedelta(days=21)).strftime('%G-W%V')), None),
+            ('POST', url_for('mark_reserved_as_ordered'), None),
+            ('GET', url_for('admin_settings'), None)
+        ]
+
+def run_route_checks(client, checks):
+    """Issue each request and read the whole (possibly streamed) body"""
+    for method, url, data in checks:
+        response = client.open(url, method=method, data=data)
+        response.get_data()
+        response.close()
+        if response.status_code >= 400:
+            print(f"⚠️ {method} {url} returned {response.status_code}")
+
+@app.cli.command('check-query-budgets')
+@click.option('--orders', default=2000, show_default=True, help='Synthetic orders to seed.')
+def check_query_budgets(orders):
+    """Run budgeted endpoints on synthetic data; exit 1 on N+1 patterns or overruns"""
+    with synthetic_database(orders, 'budgets.db') as database:
+        checks = budget_route_checks(database)
+        client = admin_test_client('budget-check')
+        
+        sql_endpoint_stats.clear()
+        recent_query_problems.clear()
+        run_route_checks(client, checks)
+        
+        problems = list(recent_query_problems)
+        print(f"Query budgets with {orders} synthetic orders:")
+        for endpoint, budget in sorted(QUERY_BUDGETS.items()):
+            stats = sql_endpoint_stats.get(endpoint)
+            if stats is None:
+                problems.append(f"{endpoint}: not exercised")
+                continue
+            mark = '✅' if stats['max_queries'] <= budget else '❌'
+            print(f"  {mark} {endpoint}: {stats['max_queries']} / {budget} queries, {stats['max_db_ms']:.1f} ms")
+        
+        if problems:
+            print("Problems:")
+            for problem in problems:
+                print(f"  ❌ {problem}")
+            sys.exit(1)
+        print("All endpoints within budget, no N+1 patterns")
+
+_PLAN_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+_PLAN_SEARCH = re.compile(r'^SEARCH (?:TABLE )?(\w+)')
+_PLAN_TEMP_BTREE = re.compile(r'^USE TEMP B-TREE FOR (.+)$')
+_PLAN_AUTOMATIC_INDEX = re.compile(r'^(?:SEARCH|SCAN|BLOOM FILTER ON) (?:TABLE )?(\w+).* AUTOMATIC ')
+
+def explain_statement(conn, sql, parameters):
+    """EXPLAIN QUERY PLAN rows (id, parent, detail); None for statements without a plan"""
+    if parameters is None:
+        # executemany statements: the plan doesn't depend on the values
+        parameters = [None] * _SQL_LITERALS.sub('', sql).count('?')
+    try:
+        rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    return [(row[0], row[1], row[3]) for row in rows] or None
+
+_SQL_TABLE_ALIASES = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_SQL_KEYWORDS = {'where', 'left', 'inner', 'join', 'on', 'order', 'group', 'limit', 'set', 'values', 'union'}
+
+def table_aliases(sql):
+    """{alias: table} for the FROM / JOIN clauses of a statement"""
+    aliases = {}
+    for table, alias in _SQL_TABLE_ALIASES.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def plan_problems(sql, plan, table_rows, large_table_rows):
+    """Full scans of large tables, automatic indexes and temp B-tree sorts"""
+    aliases = table_aliases(sql)
+    problems = []
+    large_tables = set()
+    for _, _, detail in plan:
+        for pattern in (_PLAN_SCAN, _PLAN_SEARCH):
+            match = pattern.match(detail)
+            table = match and aliases.get(match.group(1), match.group(1))
+            if table and table_rows.get(table, 0) >= large_table_rows:
+                large_tables.add(table)
+    # Walking an index in ORDER BY order stops after LIMIT rows, so it is not a full scan
+    index_ordered_limit = (re.search(r'\bLIMIT\b', sql, re.IGNORECASE)
+                           and not any('TEMP B-TREE FOR ORDER BY' in detail for _, _, detail in plan))
+    for _, _, detail in plan:
+        match = _PLAN_SCAN.match(detail)
+        table = match and aliases.get(match.group(1), match.group(1))
+        if index_ordered_limit and ' USING INDEX ' in detail:
+            table = None
+        if table in large_tables:
+            problems.append(f'SCAN {table}'
+                            + (' (covering index)' if 'COVERING INDEX' in detail else ''))
+        # SQLite builds an automatic index when no real one fits, on every run of the statement
+        match = _PLAN_AUTOMATIC_INDEX.match(detail)
+        if match:
+            problems.append(f'AUTOMATIC INDEX ON {aliases.get(match.group(1), match.group(1))}')
+        # Sorts are flagged whatever the table size: a small table can feed a large join
+        match = _PLAN_TEMP_BTREE.match(detail)
+        if match:
+            problems.append(f'TEMP B-TREE FOR {match.group(1)}')
+    return sorted(set(problems))
+
+def format_plan(plan):
+    """Plan rows as an indented tree"""
+    depth = {0: 0}
+    lines = []
+    for node_id, parent, detail in plan:
+        depth[node_id] = depth.get(parent, 0) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+@app.cli.command('explain-queries')
+@click.option('--orders', default=5000, show_default=True, help='Synthetic orders to seed.')
+@click.option('--large-table-rows', default=1000, show_default=True,
+              help='Only flag full scans of tables with at least this many rows.')
+@click.option('--baseline', type=click.Path(dir_okay=False), default='query_plan_baseline.json',
+              show_default=True, help='Accepted plan problems; anything new fails the check.')
+@click.option('--update-baseline', is_flag=True, help='Accept the current plan problems.')
+@click.option('--verbose', is_flag=True, help='Print every plan, not only flagged ones.')
+def explain_queries(orders, large_table_rows, baseline, update_baseline, verbose):
+    """EXPLAIN QUERY PLAN every statement the routes run; exit 1 on new scans, automatic indexes or temp B-trees"""
+    with synthetic_database(orders, 'plans.db') as database:
+        checks = audit_route_checks(database)
+        client = admin_test_client('plan-audit')
+        
+        with collect_sql_statements() as statements:
+            run_route_checks(client, checks)
+        
+        conn = sqlite3.connect(database)
+        table_rows = {
+            name: conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        report = {}
+        for key, statement in sorted(statements.items()):
+            plan = explain_statement(conn, statement['sql'], statement['params'])
+            if plan is None:
+                continue
+            report[key] = {
+                'endpoints': sorted(statement['endpoints']),
+                'plan': plan,
+                'problems': plan_problems(statement['sql'], plan, table_rows, large_table_rows)
+            }
+        conn.close()
+    
+    flagged = {key: entry['problems'] for key, entry in report.items() if entry['problems']}
+    print(f"Query plans for {len(report)} statements with {orders} synthetic orders "
+          f"({len(flagged)} flagged):")
+    for key, entry in report.items():
+        if not entry['problems'] and not verbose:
+            continue
+        mark = '❌' if entry['problems'] else '✅'
+        print(f"\n{mark} {key}")
+        print(f"   endpoints: {', '.join(entry['endpoints'])}")
+        for line in format_plan(entry['plan']):
+            print(f"   {line}")
+        for problem in entry['problems']:
+            print(f"   ⚠️ {problem}")
+    
+    if update_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(flagged, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {baseline} ({len(flagged)} accepted statements)")
+        return
+    
+    accepted = {}
+    if os.path.exists(baseline):
+        with open(baseline) as f:
+            accepted = json.load(f)
+    new_problems = [
+        f"{problem}: {key}"
+        for key, problems in flagged.items()
+        for problem in problems if problem not in accepted.get(key, [])
+    ]
+    fixed = [key for key, problems in accepted.items() if not set(problems) & set(flagged.get(key, []))]
+    
+    if fixed:
+        print(f"\n{len(fixed)} baseline statement(s) no longer flagged; run with --update-baseline")
+    if new_problems:
+        print("\nNew plan problems:")
+        for problem in new_problems:
+            print(f"  ❌ {problem}")
+        sys.exit(1)
+    print("\nNo plan problems beyond the baseline")
+
+# Synthetic order counts for `flask benchmark --datasets`
+BENCHMARK_DATASETS = {'small': 1000, 'medium': 20000, 'large': 100000}
+# Stop repeating a slow route after this long (it still gets 3 runs)
+BENCHMARK_MAX_SECONDS = 10
+
+def timing_summary(samples, unit='ms'):
+    """Median / p95 / mean / min of a list of timings"""
+    samples = sorted(samples)
+    return {
+        f'median_{unit}': round(samples[len(samples) // 2], 4),
+        f'p95_{unit}': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        f'mean_{unit}': round(sum(samples) / len(samples), 4),
+        f'min_{unit}': round(samples[0], 4),
+        'runs': len(samples)
+    }
+
+def time_request(run, setup=None, iterations=20, warmup=2):
+    """Time `run()` (a test-client request) including reading the whole body"""
+    samples = []
+    deadline = time.perf_counter() + BENCHMARK_MAX_SECONDS
+    for n in range(warmup + iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        response = run()
+        response.get_data()
+        response.close()
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise click.ClickException(f'{response.request.path} returned {response.status_code}')
+        if n >= warmup:
+            samples.append(elapsed)
+            if len(samples) >= 3 and time.perf_counter() > deadline:
+                break
+    return timing_summary(samples)
+
+def benchmark_routes(database, iterations):
+    """Time the hot customer and admin routes against one synthetic database"""
+    conn = sqlite3.connect(database)
+    product_ids = [row[0] for row in conn.execute('SELECT id FROM products LIMIT 3')]
+    # Every payment POST needs an order still waiting for its receipt
+    pending = [row[0] for row in conn.execute(
+        "SELECT order_id FROM orders WHERE status = 'reserved' AND payment_status = 'pending' LIMIT ?",
+        (iterations + 2,)
+    )]
+    conn.close()
+    
+    client = admin_test_client('benchmark')
+    cart = {f'quantity_{product_id}': '2' for product_id in product_ids}
+    customer = {'customer_name': 'Bench Mark', 'contact_number': '0123456789',
+                'address': '1 Jalan Bench', 'postcode': '50000', 'state': 'Selangor'}
+    receipt = lambda: {'payment_method': PAYMENT_METHODS[0],
+                       'receipt': (io.BytesIO(RECEIPT_PLACEHOLDER), 'receipt.png')}
+    with app.test_request_context():
+        urls = {endpoint: url_for(endpoint) for endpoint in (
+            'user_products', 'add_to_cart', 'user_checkout', 'admin_dashboard',
+            'admin_orders', 'admin_verify_payments', 'reservation_report'
+        )}
+        payment_urls = iter([url_for('payment_page', order_id=order_id) for order_id in pending])
+    
+    cases = [
+        ('user_products', None, lambda: client.get(urls['user_products'])),
+        ('add_to_cart', None, lambda: client.post(urls['add_to_cart'], data=cart)),
+        ('user_checkout POST', lambda: client.post(urls['add_to_cart'], data=cart),
+         lambda: client.post(urls['user_checkout'], data=customer)),
+        ('payment_page POST', None, lambda: client.post(next(payment_urls), data=receipt())),
+        ('admin_dashboard', None, lambda: client.get(urls['admin_dashboard'])),
+        ('admin_orders', None, lambda: client.get(urls['admin_orders'])),
+        ('admin_verify_payments', None, lambda: client.get(urls['admin_verify_payments'])),
+        ('reservation_report', None, lambda: client.get(urls['reservation_report']))
+    ]
+    results = {}
+    for name, setup, run in cases:
+        results[name] = time_request(run, setup, iterations)
+        print(f"   {name}: {results[name]['median_ms']:.2f} ms median, "
+              f"{results[name]['p95_ms']:.2f} ms p95 ({results[name]['runs']} runs)")
+    return results
+
+def time_function(call, number=1000, repeat=7):
+    """Per-call time of `call()` in microseconds, best-of style repeats"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        samples.append((time.perf_counter() - started) * 1e6 / number)
+    return timing_summary(samples, unit='us')
+
+def benchmark_functions():
+    """Time the Telegram message builder and the datetimeformat filter directly"""
+    cart_items = [{'id': n, 'name': f'Product {n}', 'price': 12.5 + n, 'weight': 0.2, 'quantity': n}
+                  for n in range(1, 5)]
+    now = datetime.now().replace(microsecond=0)
+    with app.test_request_context():
+        results = {
+            'format_order_reservation': time_function(lambda: format_order_reservation(
+                'EF123456', 'Bench Mark', '0123456789', cart_items, 7.0, 115.0,
+                '1 Jalan Bench', '50000', 'Selangor'
+            )),
+            'datetimeformat[str]': time_function(lambda: datetimeformat(now.isoformat(' '))),
+            'datetimeformat[datetime]': time_function(lambda: datetimeformat(now))
+        }
+    for name, result in results.items():
+        print(f"   {name}: {result['median_us']:.2f} µs median")
+    return results
+
+def compare_benchmarks(baseline, current, threshold):
+    """(name, old, new, unit) for every median that got slower than `threshold` allows"""
+    def medians(results):
+        flat = {f'functions/{name}': result for name, result in results.get('functions', {}).items()}
+        for dataset, routes in results.get('datasets', {}).items():
+            flat.update({f'{dataset}/{name}': result for name, result in routes['routes'].items()})
+        return flat
+    
+    regressions = []
+    old_medians = medians(baseline)
+    for name, result in medians(current).items():
+        old = old_medians.get(name)
+        if old is None:
+            continue
+        unit = 'ms' if 'median_ms' in result else 'us'
+        if result[f'median_{unit}'] > old[f'median_{unit}'] * (1 + threshold):
+            regressions.append((name, old[f'median_{unit}'], result[f'median_{unit}'], unit))
+    return regressions
+
+@app.cli.command('benchmark')
+@click.option('--datasets', default=','.join(BENCHMARK_DATASETS), show_default=True,
+              help='Comma-separated dataset sizes to run.')
+@click.option('--iterations', default=20, show_default=True, help='Timed requests per route.')
+@click.option('--output', type=click.Path(dir_okay=False), default='benchmark_results.json',
+              show_default=True, help='Where to write the results.')
+@click.option('--compare', 'compare_path', type=click.Path(exists=True, dir_okay=False),
+              help='Earlier results to compare against; exit 1 on regressions.')
+@click.option('--threshold', default=0.25, show_default=True,
+              help='Allowed slowdown of a median before it counts as a regression (0.25 = 25%).')
+def benchmark(datasets, iterations, output, compare_path, threshold):
+    """Benchmark hot routes and helpers on synthetic datasets and write JSON results"""
+    names = [name.strip() for name in datasets.split(',') if name.strip()]
+    unknown = [name for name in names if name not in BENCHMARK_DATASETS]
+    if unknown:
+        raise click.BadParameter(f"unknown dataset(s): {', '.join(unknown)}", param_hint='--datasets')
+    
+    results = {
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'sqlite': sqlite3.sqlite_version,
+        'iterations': iterations,
+        'datasets': {},
+        'functions': {}
+    }
+    for name in names:
+        orders = BENCHMARK_DATASETS[name]
+        print(f"📊 {name} ({orders} orders)")
+        with synthetic_database(orders, f'benchmark_{name}.db') as database:
+            results['datasets'][name] = {'orders': orders, 'routes': benchmark_routes(database, iterations)}
+    print("📊 functions")
+    results['functions'] = benchmark_functions()
+    
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    print(f"Results written to {output}")
+    
+    if compare_path:
+        with open(compare_path) as f:
+            baseline = json.load(f)
+        regressions = compare_benchmarks(baseline, results, threshold)
+        if regressions:
+            print(f"Regressions beyond {threshold:.0%} against {compare_path}:")
+            for name, old, new, unit in regressions:
+                print(f"  ❌ {name}: {old:.2f} -> {new:.2f} {unit} ({new / old - 1:+.0%})")
+            sys.exit(1)
+        print(f"No regressions beyond {threshold:.0%} against {compare_path}")
+
+class TelegramStubHandler(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for the Telegram Bot API with injectable latency and failures"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.messages += 1
+        time.sleep(self.server.latency)
+        failed = random.random() < self.server.error_rate
+        body = b'{"ok": false}' if failed else b'{"ok": true, "result": {}}'
+        self.send_response(500 if failed else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_telegram_stub(latency_ms=0, error_rate=0.0):
+    """Serve the Telegram stub on a free local port in a background thread"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), TelegramStubHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.error_rate = error_rate
+    server.messages = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port():
+    """A TCP port nothing is listening on right now"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def percentile(samples, q):
+    """q-th percentile (0-100) of an already sorted list"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+class LoadRecorder:
+    """Thread-safe latencies per journey step plus an error breakdown"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.journeys = collections.Counter()
+
+    def request(self, http, step, method, url, expect=(200, 302), **kwargs):
+        """Issue one request, record its latency and classify failures; None on error"""
+        started = time.perf_counter()
+        try:
+            response = http.request(method, url, allow_redirects=False, timeout=60, **kwargs)
+        except requests.RequestException as e:
+            error = type(e).__name__
+            response = None
+        else:
+            error = None if response.status_code in expect else f'HTTP {response.status_code}'
+        elapsed = (time.perf_counter() - started) * 1000
+        with self.lock:
+            self.latencies[step].append(elapsed)
+            if error:
+                self.errors[f'{step}: {error}'] += 1
+        return None if error else response
+
+    def fail(self, step, reason):
+        with self.lock:
+            self.errors[f'{step}: {reason}'] += 1
+
+    def finished(self, journey):
+        with self.lock:
+            self.journeys[journey] += 1
+
+def customer_journey(recorder, http, base_url, product_ids, paid_orders):
+    """Browse, fill the cart, reserve and upload a receipt, as one shopper"""
+    if not recorder.request(http, 'browse', 'GET', f'{base_url}/user/products'):
+        return
+    chosen = random.sample(product_ids, min(len(product_ids), random.randint(1, 3)))
+    cart = {f'quantity_{product_id}': str(random.randint(1, 4)) for product_id in chosen}
+    if not recorder.request(http, 'add_to_cart', 'POST', f'{base_url}/user/cart/add', data=cart):
+        return
+    if not recorder.request(http, 'checkout', 'GET', f'{base_url}/user/checkout'):
+        return
+    response = recorder.request(http, 'reserve', 'POST', f'{base_url}/user/checkout', data={
+        'customer_name': 'Load Test', 'contact_number': f'01{random.randint(10000000, 99999999)}',
+        'address': '1 Jalan Beban', 'postcode': '50000', 'state': random.choice(STATE_REGIONS['west'])
+    })
+    if response is None:
+        return
+    location = response.headers.get('Location', '')
+    if '/reservation/complete/' not in location:
+        recorder.fail('reserve', 'order not created')
+        return
+    order_id = location.rsplit('/', 1)[-1]
+    
+    if not recorder.request(http, 'payment_page', 'GET', f'{base_url}/payment/{order_id}'):
+        return
+    response = recorder.request(http, 'upload_receipt', 'POST', f'{base_url}/payment/{order_id}', data={
+        'payment_method': PAYMENT_METHODS[0]
+    }, files={'receipt': ('receipt.png', RECEIPT_PLACEHOLDER, 'image/png')})
+    if response is None:
+        return
+    paid_orders.put(order_id)
+    recorder.finished('customer')
+
+def admin_journey(recorder, http, base_url, paid_orders):
+    """Dashboard, verify one paid order, then the report and order list"""
+    recorder.request(http, 'admin_dashboard', 'GET', f'{base_url}/admin/', expect=(200,))
+    recorder.request(http, 'admin_verify_payments', 'GET', f'{base_url}/admin/verify_payments', expect=(200,))
+    try:
+        order_id = paid_orders.get_nowait()
+    except queue.Empty:
+        order_id = None
+    if order_id:
+        response = recorder.request(http, 'verify_payment', 'POST',
+                                    f'{base_url}/admin/orders/verify_payment/{order_id}',
+                                    expect=(200,), data={'action': 'verify'})
+        if response is not None and not response.json().get('success'):
+            recorder.fail('verify_payment', response.json().get('message', 'failed'))
+    recorder.request(http, 'reservation_report', 'GET', f'{base_url}/admin/reservation_report', expect=(200,))
+    recorder.request(http, 'admin_orders', 'GET', f'{base_url}/admin/orders', expect=(200,))
+    recorder.finished('admin')
+
+def run_load(base_url, product_ids, customers, admins, duration, think_ms, admin_password):
+    """Run virtual customers and admins against base_url for `duration` seconds"""
+    recorder = LoadRecorder()
+    paid_orders = queue.Queue()
+    deadline = time.monotonic() + duration
+    
+    def virtual_user(journey):
+        http = requests.Session()
+        if journey is admin_journey:
+            response = recorder.request(http, 'admin_login', 'POST', f'{base_url}/admin/login',
+                                        expect=(302,), data={'username': 'admin', 'password': admin_password})
+            if response is None:
+                return
+        while time.monotonic() < deadline:
+            if journey is admin_journey:
+                journey(recorder, http, base_url, paid_orders)
+            else:
+                journey(recorder, http, base_url, product_ids, paid_orders)
+            time.sleep(random.uniform(0, 2 * think_ms) / 1000)
+    
+    threads = [threading.Thread(target=virtual_user, args=(customer_journey,)) for _ in range(customers)]
+    threads += [threading.Thread(target=virtual_user, args=(admin_journey,)) for _ in range(admins)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+def scrape_server_counters(base_url, admin_password):
+    """sqlite busy/retry and Telegram counters from the app's own /metrics"""
+    http = requests.Session()
+    http.post(f'{base_url}/admin/login', data={'username': 'admin', 'password': admin_password})
+    counters = collections.Counter()
+    try:
+        text = http.get(f'{base_url}/metrics', timeout=30).text
+    except requests.RequestException:
+        return counters
+    for line in text.splitlines():
+        name = line.split('{', 1)[0].split(' ', 1)[0]
+        if name in ('sqlite_busy_total', 'sqlite_retries_total', 'telegram_messages_total'):
+            label = re.search(r'result="(\w+)"', line)
+            counters[name + (f'[{label.group(1)}]' if label else '')] += float(line.rsplit(' ', 1)[1])
+        elif name == 'http_requests_total' and 'status="500"' in line:
+            counters['http 500'] += float(line.rsplit(' ', 1)[1])
+    return counters
+
+@app.cli.command('load-test')
+@click.option('--workers', default=1, show_default=True, help='gunicorn worker processes.')
+@click.option('--threads', default=WORKER_THREADS, show_default=True, help='gunicorn threads per worker (defaults to the render.yaml setting).')
+@click.option('--customers', default=20, show_default=True, help='Concurrent virtual customers.')
+@click.option('--admins', default=2, show_default=True, help='Concurrent virtual admins.')
+@click.option('--duration', default=60, show_default=True, help='Seconds to generate load.')
+@click.option('--think-ms', default=200, show_default=True, help='Mean pause between journeys.')
+@click.option('--orders', default=20000, show_default=True, help='Synthetic orders to start from.')
+@click.option('--database', type=click.Path(exists=True, dir_okay=False),
+              help='Start from a copy of this database instead of synthetic data.')
+@click.option('--telegram-latency-ms', default=300, show_default=True, help='Delay of the Telegram stub.')
+@click.option('--telegram-error-rate', default=0.0, show_default=True, help='Share of Telegram calls that fail.')
+@click.option('--admin-password', default='admin123', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Also write the report as JSON.')
+def load_test(workers, threads, customers, admins, duration, think_ms, orders, database,
+              telegram_latency_ms, telegram_error_rate, admin_password, output):
+    """Boot the app under gunicorn and drive concurrent customer and admin journeys"""
+    workdir = tempfile.mkdtemp()
+    database_path = os.path.join(workdir, 'load.db')
+    if database:
+        conn = sqlite3.connect(database)
+        conn.execute('VACUUM INTO ?', (database_path,))
+        conn.close()
+    else:
+        print(f"Seeding {orders} synthetic orders...")
+        build_synthetic_database(database_path, orders)
+    conn = sqlite3.connect(database_path)
+    product_ids = [row[0] for row in conn.execute('SELECT id FROM products')]
+    conn.close()
+    
+    stub = start_telegram_stub(telegram_latency_ms, telegram_error_rate)
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ,
+               DATABASE=database_path,
+               UPLOAD_FOLDER=os.path.join(workdir, 'receipts'),
+               METRICS_DIR=os.path.join(workdir, 'metrics'),
+               SLOW_QUERY_LOG=os.path.join(workdir, 'slow_queries.log'),
+               TELEGRAM_API_URL=f'http://127.0.0.1:{stub.server_address[1]}')
+    os.makedirs(env['UPLOAD_FOLDER'])
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    with open(log_path, 'w') as server_log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+             '--workers', str(workers), '--threads', str(threads), '--timeout', '120'],
+            cwd=app.root_path, env=env, stdout=server_log, stderr=subprocess.STDOUT
+        )
+        
+        try:
+            for _ in range(100):
+                try:
+                    requests.get(f'{base_url}/user/products', timeout=5)
+                    break
+                except requests.RequestException:
+                    if server.poll() is not None:
+                        raise click.ClickException(f'gunicorn exited; see {log_path}')
+                    time.sleep(0.2)
+            else:
+                raise click.ClickException(f'gunicorn did not start; see {log_path}')
+            
+            print(f"🚦 {customers} customers + {admins} admins for {duration}s against "
+                  f"{workers} worker(s) x {threads} thread(s), Telegram stub at {telegram_latency_ms} ms")
+            recorder, elapsed = run_load(base_url, product_ids, customers, admins, duration, think_ms, admin_password)
+            server_counters = scrape_server_counters(base_url, admin_password)
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            stub.shutdown()
+    
+    total = sum(len(samples) for samples in recorder.latencies.values())
+    report = {
+        'workers': workers, 'threads': threads, 'customers': customers, 'admins': admins,
+        'duration_s': round(elapsed, 1),
+        'requests': total,
+        'requests_per_second': round(total / elapsed, 1),
+        'journeys': dict(recorder.journeys),
+        'telegram_messages': stub.messages,
+        'steps': {},
+        'errors': dict(recorder.errors.most_common()),
+        'server': dict(server_counters)
+    }
+    print(f"\n{total} requests in {elapsed:.1f}s = {report['requests_per_second']} req/s; "
+          f"journeys: {dict(recorder.journeys)}; Telegram messages: {stub.messages}")
+    print(f"{'step':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, samples in recorder.latencies.items():
+        samples.sort()
+        report['steps'][step] = {
+            'count': len(samples),
+            'p50_ms': round(percentile(samples, 50), 1),
+            'p95_ms': round(percentile(samples, 95), 1),
+            'p99_ms': round(percentile(samples, 99), 1),
+            'max_ms': round(samples[-1], 1)
+        }
+        row = report['steps'][step]
+        print(f"{step:<24}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    
+    if recorder.errors:
+        print("\nErrors:")
+        for error, count in recorder.errors.most_common():
+            print(f"  ❌ {error}: {count}")
+    else:
+        print("\nNo errors")
+    if server_counters:
+        print("Server counters: " + ', '.join(f'{name}={value:g}' for name, value in sorted(server_counters.items())))
+    
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"Report written to {output}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+# Stand-ins for recorded fields whose values were not kept
+REPLAY_FIELD_VALUES = {
+    'customer_name': 'Replay Customer',
+    'contact_number': '0123456789',
+    'address': '1 Jalan Replay',
+    'postcode': '50000',
+    'tracking_number': 'REPLAY0001',
+    'username': 'admin'
+}
+
+def load_traces(paths):
+    """Traces from every given file (all workers, rotated files too), oldest first"""
+    traces = []
+    for pattern in paths:
+        for path in sorted(pathlib.Path().glob(pattern)) if any(c in pattern for c in '*?[') else [pathlib.Path(pattern)]:
+            with open(path) as f:
+                traces.extend(json.loads(line) for line in f if line.strip())
+    traces.sort(key=lambda trace: trace['ts'])
+    return traces
+
+def replay_fields(shape, admin_password):
+    """Concrete form / query values for a recorded field shape"""
+    values = {}
+    for key, value in shape.items():
+        if isinstance(value, str):
+            values[key] = value
+        elif key.endswith('password'):
+            values[key] = admin_password
+        else:
+            values[key] = REPLAY_FIELD_VALUES.get(key, 'x' * value['len'])
+    return values
+
+def replay_session(recorder, traces, base_url, started, speed, admin_password, id_map, id_lock, lateness):
+    """Re-issue one visitor's requests in order at their (scaled) original offsets"""
+    http = requests.Session()
+    if traces[0]['admin'] and traces[0]['endpoint'] != 'admin_login':
+        recorder.request(http, 'admin_login', 'POST', f'{base_url}/admin/login', expect=(302,),
+                         data={'username': 'admin', 'password': admin_password})
+    
+    for trace in traces:
+        if speed:
+            delay = started + trace['offset'] / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                with id_lock:
+                    lateness.append(-delay * 1000)
+        
+        # Orders created during the replay get new IDs; follow them
+        with id_lock:
+            path = '/'.join(id_map.get(part, part) for part in trace['path'].split('/'))
+        files = {
+            name: ('replay.png', RECEIPT_PLACEHOLDER + b'\0' * max(0, min(info['size'], 5 * 1024 * 1024)
+                                                                    - len(RECEIPT_PLACEHOLDER)), 'image/png')
+            for name, info in trace['files'].items()
+        }
+        response = recorder.request(
+            http, trace['endpoint'] or '<unmatched>', trace['method'], base_url + path,
+            expect=(trace['status'],),
+            params=replay_fields(trace['query'], admin_password),
+            data=replay_fields(trace['form'], admin_password) or None,
+            files=files or None
+        )
+        if response is not None and trace.get('location') and response.headers.get('Location'):
+            old_id = trace['location'].rstrip('/').rsplit('/', 1)[-1]
+            new_id = urllib.parse.urlsplit(response.headers['Location']).path.rstrip('/').rsplit('/', 1)[-1]
+            if old_id != new_id:
+                with id_lock:
+                    id_map[old_id] = new_id
+
+@app.cli.command('replay-traffic')
+@click.argument('trace_files', nargs=-1, required=True)
+@click.option('--base-url', default='http://127.0.0.1:5000', show_default=True,
+              help='A local copy of the app (never production).')
+@click.option('--speed', default=1.0, show_default=True,
+              help='1 = original timing, 4 = four times faster, 0 = as fast as possible.')
+@click.option('--admin-password', default='admin123', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False), help='Also write the report as JSON.')
+def replay_traffic(trace_files, base_url, speed, admin_password, output):
+    """Replay recorded TRAFFIC_LOG traces against a local copy of the app"""
+    traces = load_traces(trace_files)
+    if not traces:
+        raise click.ClickException('No traces found')
+    first = traces[0]['ts']
+    sessions = {}
+    for trace in traces:
+        trace['offset'] = trace['ts'] - first
+        sessions.setdefault(trace['session'], []).append(trace)
+    
+    recorded_span = traces[-1]['ts'] - first
+    print(f"▶️ Replaying {len(traces)} requests from {len(sessions)} visitors spanning "
+          f"{recorded_span:.0f}s at {'full speed' if not speed else f'{speed:g}x'} against {base_url}")
+    
+    recorder = LoadRecorder()
+    id_map = {}
+    id_lock = threading.Lock()
+    lateness = []
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=replay_session, args=(recorder, session_traces, base_url, started, speed,
+                                                      admin_password, id_map, id_lock, lateness))
+        for session_traces in sessions.values()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    
+    recorded_ms = collections.defaultdict(list)
+    for trace in traces:
+        recorded_ms[trace['endpoint'] or '<unmatched>'].append(trace['ms'])
+    total = sum(len(samples) for samples in recorder.latencies.values())
+    report = {'requests': total, 'duration_s': round(elapsed, 1), 'speed': speed,
+              'requests_per_second': round(total / elapsed, 1), 'steps': {},
+              'errors': dict(recorder.errors.most_common()),
+              'late_requests': len(lateness),
+              'max_lateness_ms': round(max(lateness, default=0), 1)}
+    print(f"\n{total} requests in {elapsed:.1f}s = {report['requests_per_second']} req/s")
+    print(f"{'endpoint':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'recorded p50':>14}")
+    for step, samples in sorted(recorder.latencies.items()):
+        samples.sort()
+        recorded = sorted(recorded_ms.get(step, []))
+        report['steps'][step] = {
+            'count': len(samples),
+            'p50_ms': round(percentile(samples, 50), 1),
+            'p95_ms': round(percentile(samples, 95), 1),
+            'p99_ms': round(percentile(samples, 99), 1),
+            'recorded_p50_ms': round(percentile(recorded, 50), 1)
+        }
+        row = report['steps'][step]
+        print(f"{step:<28}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['recorded_p50_ms']:>14}")
+    
+    if lateness:
+        print(f"\n{len(lateness)} requests started behind schedule (worst {report['max_lateness_ms']} ms)")
+    if recorder.errors:
+        print("\nStatus differences from the recording:")
+        for error, count in recorder.errors.most_common():
+            print(f"  ❌ {error}: {count}")
+    else:
+        print("\nEvery response matched its recorded status")
+    
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"Report written to {output}")
@@ -0,0 +1,15 @@
+"""gunicorn settings for the web service (see render.yaml)"""
+import os
+import pathlib
+import tempfile
+
+
+def on_starting(server):
+    """Empty METRICS_DIR before the first worker starts, so each deploy's counters begin at zero"""
+    # Same default as app.py; the master never imports the app
+    directory = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'eunicefoodie-metrics')
+    for path in pathlib.Path(directory).glob('metrics_*.db*'):
+        try:
+            path.unlink()
+        except OSError:
+            pass
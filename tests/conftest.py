@@ -0,0 +1,28 @@
+import sqlite3
+
+import pytest
+
+import cli
+
+
+@pytest.fixture
+def database():
+    """Path of a throwaway synthetic database the app points at for the test"""
+    with cli.synthetic_database(300, 'tests.db') as path:
+        yield path
+
+
+@pytest.fixture
+def db(database):
+    """Separate connection for arranging data and checking results"""
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def admin(database):
+    """Test client logged in as admin"""
+    return cli.admin_test_client('tests')
+
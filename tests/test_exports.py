@@ -0,0 +1,70 @@
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+from app import EXPORT_ORDER_HEADER, EXPORT_PRODUCT_HEADER
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+# A closed batch inside the synthetic data's 90 days, so the export comes from a frozen snapshot
+CLOSED_BATCH = (datetime.now() - timedelta(days=21)).strftime('%G-W%V')
+EXPORT_URL = '/admin/export/reservation_report/{}?batch=' + CLOSED_BATCH
+
+
+def csv_sections(body):
+    """{title: (header, rows)} from a sectioned export"""
+    assert body.startswith('﻿')
+    sections = {}
+    rows = iter(csv.reader(io.StringIO(body[1:])))
+    for row in rows:
+        if not row:
+            continue
+        sections[row[0]] = (next(rows), [])
+        for line in rows:
+            if not line:
+                break
+            sections[row[0]][1].append(line)
+    return sections
+
+
+def sheet_rows(workbook, n):
+    root = ElementTree.fromstring(workbook.read(f'xl/worksheets/sheet{n}.xml'))
+    return [[''.join(cell.itertext()) for cell in row] for row in root.iter(f'{MAIN_NS}row')]
+
+
+def test_csv_export_is_well_formed(database, admin):
+    response = admin.get(EXPORT_URL.format('csv'))
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    sections = csv_sections(response.get_data(as_text=True))
+    assert list(sections) == ['Products', 'Orders']
+    for title, expected in (('Products', EXPORT_PRODUCT_HEADER), ('Orders', EXPORT_ORDER_HEADER)):
+        header, rows = sections[title]
+        assert header == expected
+        assert rows
+        assert all(len(row) == len(expected) for row in rows)
+
+
+def test_xlsx_export_matches_csv(database, admin):
+    sections = csv_sections(admin.get(EXPORT_URL.format('csv')).get_data(as_text=True))
+    response = admin.get(EXPORT_URL.format('xlsx'))
+
+    assert response.status_code == 200
+    workbook = zipfile.ZipFile(io.BytesIO(response.get_data()))
+    assert workbook.testzip() is None
+    for name in workbook.namelist():
+        ElementTree.fromstring(workbook.read(name))
+
+    sheets = ElementTree.fromstring(workbook.read('xl/workbook.xml')).iter(f'{MAIN_NS}sheet')
+    assert [sheet.get('name') for sheet in sheets] == ['Products', 'Orders']
+    for n, title in enumerate(('Products', 'Orders'), 1):
+        header, rows = sections[title]
+        sheet = sheet_rows(workbook, n)
+        assert sheet[0] == header
+        assert len(sheet) == len(rows) + 1
+
+
+def test_unknown_export_format_is_rejected(database, admin):
+    assert admin.get(EXPORT_URL.format('pdf')).status_code == 400
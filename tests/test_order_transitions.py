@@ -0,0 +1,64 @@
+import cli
+import pytest
+
+from app import OrderTransitionError, app, transition_order
+
+
+def test_second_verify_is_rejected(db, admin):
+    order_id = cli.sample_order_id(db, 'reserved', 'pending_verification')
+
+    first = admin.post(f'/admin/orders/verify_payment/{order_id}', data={'action': 'verify'})
+    second = admin.post(f'/admin/orders/verify_payment/{order_id}', data={'action': 'verify'})
+
+    assert first.get_json()['success'] is True
+    assert second.get_json()['success'] is False
+    assert db.execute('SELECT payment_status FROM orders WHERE order_id = ?',
+                      (order_id,)).fetchone()[0] == 'verified'
+
+
+def test_transition_order_rejects_wrong_state(db):
+    order_id = cli.sample_order_id(db, 'cancelled', 'pending')
+
+    with app.test_request_context():
+        app.preprocess_request()
+        with pytest.raises(OrderTransitionError):
+            transition_order(order_id, 'verify_payment', payment_verified_by='tests')
+
+
+def test_edit_order_with_stale_version_conflicts(db, admin):
+    order = db.execute('SELECT * FROM orders WHERE order_id = ?',
+                       (cli.sample_order_id(db, 'reserved', 'pending'),)).fetchone()
+    form = {
+        'customer_name': 'Someone Else',
+        'contact_number': order['contact_number'],
+        'address': order['address'],
+        'postcode': order['postcode'],
+        'state': order['state'],
+        'status': order['status'],
+        'payment_status': order['payment_status'],
+        'tracking_number': order['tracking_number'] or '',
+        'expected_version': order['version'] - 1
+    }
+
+    response = admin.post(f'/admin/orders/edit/{order["order_id"]}', data=form)
+
+    assert response.status_code == 409
+    after = db.execute('SELECT customer_name, version FROM orders WHERE order_id = ?',
+                       (order['order_id'],)).fetchone()
+    assert tuple(after) == (order['customer_name'], order['version'])
+
+
+def test_edit_items_with_stale_version_conflicts(db, admin):
+    order = db.execute('SELECT * FROM orders WHERE order_id = ?',
+                       (cli.sample_order_id(db, 'reserved', 'pending'),)).fetchone()
+    items = db.execute('SELECT product_id, quantity FROM order_items WHERE order_id = ? ORDER BY id',
+                       (order['order_id'],)).fetchall()
+    form = {f'quantity_{item["product_id"]}': item['quantity'] + 1 for item in items}
+    form['expected_version'] = order['version'] - 1
+
+    response = admin.post(f'/admin/orders/edit_items/{order["order_id"]}', data=form)
+
+    assert response.status_code == 409
+    after = db.execute('SELECT product_id, quantity FROM order_items WHERE order_id = ? ORDER BY id',
+                       (order['order_id'],)).fetchall()
+    assert [tuple(row) for row in after] == [tuple(row) for row in items]
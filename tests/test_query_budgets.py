@@ -0,0 +1,22 @@
+import cli
+from app import QUERY_BUDGETS, find_repeated_queries, recent_query_problems, sql_endpoint_stats
+
+
+def test_budgeted_endpoints_stay_within_budget(database, admin):
+    sql_endpoint_stats.clear()
+    recent_query_problems.clear()
+    cli.run_route_checks(admin, cli.budget_route_checks(database))
+
+    assert list(recent_query_problems) == []
+    for endpoint, budget in QUERY_BUDGETS.items():
+        assert endpoint in sql_endpoint_stats, f'{endpoint} not exercised'
+        assert sql_endpoint_stats[endpoint]['max_queries'] <= budget, endpoint
+
+
+def test_find_repeated_queries_flags_per_row_lookups():
+    sql = 'SELECT * FROM order_items WHERE order_id = ?'
+    queries = [{'sql': sql, 'params': (f'ORD{n}',)} for n in range(10)]
+    queries.append({'sql': 'SELECT COUNT(*) FROM products', 'params': ()})
+
+    assert find_repeated_queries(queries) == {sql: 10}
+    assert find_repeated_queries(queries[:2]) == {}
@@ -0,0 +1,50 @@
+import cli
+
+from app import rebuild_reservation_summary
+
+SUMMARY_ROWS = '''
+    SELECT product_id, status, total_quantity, ROUND(total_weight, 6), ROUND(total_cost, 2), order_count
+    FROM reservation_summary
+    ORDER BY product_id, status
+'''
+
+
+def summary_rows(conn):
+    return [tuple(row) for row in conn.execute(SUMMARY_ROWS)]
+
+
+def assert_matches_rebuild(conn):
+    """The incrementally maintained table equals one rebuilt from order_items"""
+    maintained = summary_rows(conn)
+    rebuild_reservation_summary(conn)
+    rebuilt = summary_rows(conn)
+    conn.rollback()
+    assert maintained == rebuilt
+
+
+def test_summary_matches_rebuild_after_seeding(db):
+    assert summary_rows(db)
+    assert_matches_rebuild(db)
+
+
+def test_summary_follows_order_changes(db, admin):
+    verified = cli.sample_order_id(db, 'reserved', 'pending_verification')
+    assert admin.post(f'/admin/orders/verify_payment/{verified}', data={'action': 'verify'}).get_json()['success']
+
+    cancelled = cli.sample_order_id(db, 'confirmed', 'verified')
+    admin.get(f'/admin/orders/cancel/{cancelled}')
+
+    edited = db.execute('SELECT * FROM orders WHERE order_id = ?',
+                        (cli.sample_order_id(db, 'confirmed', 'verified'),)).fetchone()
+    items = db.execute('SELECT product_id, quantity FROM order_items WHERE order_id = ?',
+                       (edited['order_id'],)).fetchall()
+    form = {f'quantity_{item["product_id"]}': item['quantity'] + 1 for item in items}
+    form['expected_version'] = edited['version']
+    assert admin.post(f'/admin/orders/edit_items/{edited["order_id"]}', data=form).status_code == 302
+
+    assert admin.post('/admin/mark_reserved_as_ordered').get_json()['success'] is True
+
+    assert db.execute('SELECT status FROM orders WHERE order_id = ?', (cancelled,)).fetchone()[0] == 'cancelled'
+    assert db.execute('SELECT SUM(quantity) FROM order_items WHERE order_id = ?',
+                      (edited['order_id'],)).fetchone()[0] == sum(item['quantity'] + 1 for item in items)
+    assert_matches_rebuild(db)